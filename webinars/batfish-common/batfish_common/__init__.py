@@ -0,0 +1 @@
+"""Helpers shared by the Batfish webinar projects."""
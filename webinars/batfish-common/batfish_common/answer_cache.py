@@ -0,0 +1,137 @@
+"""On-disk cache of Batfish answers, keyed by snapshot content, question and parameters."""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+# Total size of the cached answers, least recently used answers are evicted above it
+MAX_BYTES = 512 * 1024 * 1024
+
+
+def hash_files(path):
+    """Return the sha256 of every file under a directory, keyed by its path in the directory."""
+    hashes = {}
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            file_path = os.path.join(root, filename)
+            with open(file_path, "rb") as file:
+                hashes[os.path.relpath(file_path, path).replace(os.sep, "/")] = hashlib.sha256(file.read()).hexdigest()
+    return hashes
+
+
+def hash_directory(path, hashes=None):
+    """Return one sha256 of the content of every file under a directory, and of their paths."""
+    digest = hashlib.sha256()
+    for file_path, file_hash in (hash_files(path) if hashes is None else hashes).items():
+        digest.update(file_path.encode() + b"\0")
+        digest.update(bytes.fromhex(file_hash))
+    return digest.hexdigest()
+
+
+def _param(value):
+    """JSON form of a question parameter, Batfish objects (HeaderConstraints, ...) by their fields."""
+    return value.dict() if hasattr(value, "dict") else str(value)
+
+
+class AnswerCache:
+    """Keep the answer frames of Batfish questions as pickle files in a directory.
+
+    An answer is only valid for the exact content of a snapshot, so the key is built
+    from a hash of the snapshot content, the question name and its parameters. Reading
+    an answer marks it as used, and the least recently used answers are deleted once
+    the directory grows over `max_bytes`. With `refresh`, cached answers are never read:
+    every question is asked again and its new answer stored.
+    """
+
+    def __init__(self, cache_dir, max_bytes=MAX_BYTES, refresh=False):
+        """Initializer."""
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(snapshot_hash, question, params=None):
+        """Return the cache key of a question asked with these parameters on a snapshot."""
+        payload = json.dumps([snapshot_hash, question, params or {}], sort_keys=True, default=_param)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key):
+        """Return the cached frame of a key, or None."""
+        if self.refresh:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                frame = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            # Missing, or evicted by another writer while it was read
+            return None
+        # The modification time is the last use of an answer
+        try:
+            os.utime(path)
+        except OSError:
+            # Evicted right after it was read, the frame read is still valid
+            pass
+        return frame
+
+    def put(self, key, frame):
+        """Store the frame of a key, then evict answers while the cache is over its size."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Written next to its final name and moved in place, readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            pickle.dump(frame, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used answers until the cache fits in max_bytes."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pkl"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # Evicted by another writer in the meantime
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def frame(self, session, snapshot_hash, question, impact=None, **params):
+        """Return the answer frame of `bf.q.<question>(**params)`, asking Batfish only on a miss.
+
+        With a ChangeImpact, a miss is answered from the answer of the previous snapshot
+        when it can be, only asking Batfish about the nodes the change affects.
+        """
+        key = self.key(snapshot_hash, question, params)
+        frame = self.get(key)
+        if frame is not None:
+            self.hits += 1
+            return frame
+
+        self.misses += 1
+
+        def ask(ask_params):
+            return getattr(session.q, question)(**ask_params).answer(snapshot=session.snapshot).frame()
+
+        frame = impact.answer(self, question, params, ask) if impact is not None else None
+        if frame is None:
+            frame = ask(params)
+        self.put(key, frame)
+        return frame
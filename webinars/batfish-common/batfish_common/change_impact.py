@@ -0,0 +1,151 @@
+"""Work out which nodes a change between two snapshots affects, and only ask Batfish about those."""
+import re
+
+import pandas as pd
+from batfish_common.replay import Questions
+
+# Questions whose answer can be scoped with a nodes parameter, and the column telling the node(s) of a row.
+# A "node" column holds node names, interfaces or "node: filter" sources, a "file" column configuration files.
+# Only questions answered from the configurations of a node and its peers are scoped. Routes, flows and the
+# established sessions (bgpSessionStatus, bgpEdges) depend on the whole control plane: a change anywhere can
+# bring a session up or down, so they are always asked again for a changed snapshot.
+NODE_COLUMNS = {
+    "bgpSessionCompatibility": ("Node", "node"),
+    "ospfSessionCompatibility": ("Interface", "node"),
+    "filterLineReachability": ("Sources", "node"),
+    "unusedStructures": ("Source_Lines", "file"),
+    "undefinedReferences": ("File_Name", "file"),
+}
+# Questions listing the sessions and adjacencies of every node, and their two node columns
+EDGE_COLUMNS = {
+    "bgpEdges": ("Node", "Remote_Node"),
+    "layer3Edges": ("Interface", "Remote_Interface"),
+}
+
+
+def changed_files(previous_files, files):
+    """Return the paths added, removed or modified between two {path: hash} of snapshot files."""
+    return sorted(path for path in set(previous_files) | set(files) if previous_files.get(path) != files.get(path))
+
+
+def _nodes(value):
+    """Node names of a cell: a node name, an interface or a list of "node: filter" sources."""
+    if isinstance(value, (list, tuple)):
+        return {str(source).split(":")[0].strip() for source in value}
+    return {str(getattr(value, "hostname", value))}
+
+
+def node_specifier(nodes):
+    """Batfish node specifier matching exactly these nodes."""
+    return "/^(" + "|".join(re.escape(node) for node in sorted(nodes)) + ")$/"
+
+
+class ChangeImpact:
+    """Nodes whose answers may differ between a previous snapshot and the current one.
+
+    They are the nodes of the changed configuration files, before and after the change,
+    and their neighbors over the edges given: a session depends on the configuration of
+    both of its ends. Answers of the previous snapshot are kept for every other node, and
+    Batfish is only asked about the affected ones.
+    """
+
+    def __init__(self, previous_hash, nodes, file_nodes=None):
+        """Initializer."""
+        self.previous_hash = previous_hash
+        self.nodes = set(nodes)
+        self.file_nodes = file_nodes or {}
+        # Every node of the previous and current snapshots
+        self.known_nodes = set().union(*self.file_nodes.values())
+
+    @classmethod
+    def between(cls, cache, answer, previous_hash, changed, edge_questions=()):
+        """Return the impact of the changed files since the previous snapshot, or None when it is unknown.
+
+        answer(question) returns the frame of a question on the current snapshot, the answers
+        of the previous snapshot are read from the AnswerCache. The impact is unknown when the
+        previous snapshot was never answered, or when a changed file is not the configuration
+        of a node (topology, ...) and may affect any of them.
+        """
+        previous_status = cache.get(cache.key(previous_hash, "fileParseStatus"))
+        if previous_status is None:
+            return None
+
+        file_nodes = {}
+        for frame in (previous_status, answer("fileParseStatus")):
+            for file_name, nodes in zip(frame["File_Name"], frame["Nodes"]):
+                file_nodes.setdefault(file_name, set()).update(nodes or [])
+        if any(not file_nodes.get(path) for path in changed):
+            return None
+
+        changed_nodes = {node for path in changed for node in file_nodes[path]}
+        nodes = set(changed_nodes)
+        for question in edge_questions:
+            previous = cache.get(cache.key(previous_hash, question))
+            if previous is None:
+                return None
+            local, remote = EDGE_COLUMNS[question]
+            for frame in (previous, answer(question)):
+                for ends in zip(frame[local], frame[remote]):
+                    ends = _nodes(ends[0]) | _nodes(ends[1])
+                    if ends & changed_nodes:
+                        nodes |= ends
+        return cls(previous_hash, nodes, file_nodes)
+
+    def _affected(self, value, kind):
+        if kind == "file":
+            return bool(self.file_nodes.get(getattr(value, "filename", value), set()) & self.nodes)
+        return bool(_nodes(value) & self.nodes)
+
+    def answer(self, cache, question, params, ask):
+        """Return the frame of a question from the previous answer and ask(params) scoped to the affected nodes.
+
+        Return None when the question has to be asked as is: it cannot be scoped, the previous
+        snapshot has no answer for it, or it is already scoped to nodes that may be affected.
+        """
+        if question not in NODE_COLUMNS:
+            return None
+        previous = cache.get(cache.key(self.previous_hash, question, params))
+        if previous is None:
+            return None
+
+        if "nodes" in params:
+            # Scoped to a single node the change does not affect, the answer did not change
+            if params["nodes"] in self.known_nodes and params["nodes"] not in self.nodes:
+                return previous
+            return None
+        if not self.nodes:
+            return previous
+
+        column, kind = NODE_COLUMNS[question]
+        affected = previous[column].map(lambda value: self._affected(value, kind)).astype(bool)
+        scoped = ask({**params, "nodes": node_specifier(self.nodes)})
+        return pd.concat([previous[~affected], scoped], ignore_index=True)
+
+
+class ImpactSession:
+    """Session asking `bf.q` questions through an AnswerCache and a ChangeImpact, for code that asks them itself.
+
+    Answers of the current snapshot come from the cache, misses only ask Batfish about
+    the nodes the change affects when they can. Everything else goes to the session.
+    """
+
+    def __init__(self, session, cache, snapshot_hash, impact=None):
+        """Initializer."""
+        self.session = session
+        self.cache = cache
+        self.snapshot_hash = snapshot_hash
+        self.impact = impact
+        self.q = Questions(self)
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__["session"], name)
+
+    def answer(self, question, params, snapshot=None, reference_snapshot=None, **kwargs):
+        """Return the answer frame of `bf.q.<question>(**params)`, from the cache on the current snapshot."""
+        if reference_snapshot or kwargs or snapshot not in (None, self.session.snapshot):
+            return (
+                getattr(self.session.q, question)(**params)
+                .answer(snapshot=snapshot, reference_snapshot=reference_snapshot, **kwargs)
+                .frame()
+            )
+        return self.cache.frame(self.session, self.snapshot_hash, question, impact=self.impact, **params)
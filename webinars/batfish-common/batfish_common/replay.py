@@ -0,0 +1,142 @@
+"""Record the answers of a live Batfish service, and replay them without one."""
+import json
+import os
+import tempfile
+
+from batfish_common.answer_cache import AnswerCache
+from pybatfish.client.session import Session
+
+# live: ask the Batfish service, record: ask it and keep every answer, replay: only use the recorded answers
+MODES = ("live", "record", "replay")
+MODE = os.getenv("BATFISH_MODE", "live")
+
+
+class ReplayMissError(LookupError):
+    """A question was asked in replay mode that was never recorded for this snapshot content."""
+
+
+class _Answer:
+    """What `bf.q.<question>(**params).answer()` returns, only the frame is kept."""
+
+    def __init__(self, frame):
+        self._frame = frame
+
+    def frame(self):
+        return self._frame
+
+
+class _Question:
+    def __init__(self, session, name, params):
+        self.session = session
+        self.name = name
+        self.params = params
+
+    def answer(self, snapshot=None, reference_snapshot=None, **kwargs):
+        return _Answer(self.session.answer(self.name, self.params, snapshot, reference_snapshot, **kwargs))
+
+
+class Questions:
+    """`bf.q` of a stand-in session, every question name is known and answered by `session.answer()`."""
+
+    def __init__(self, session):
+        self._session = session
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return lambda **params: _Question(self._session, name, params)
+
+
+class RecordedSession:
+    """Stand-in for a pybatfish Session answering questions from recordings.
+
+    A recording is the answer frame of a question, keyed by the hash of the snapshot
+    content it was asked on, the question name and its parameters, next to a JSON file
+    of the request. With a live session every question is asked to Batfish and recorded,
+    anything else (init_snapshot, list_snapshots, ...) goes to the live session. Without
+    one, questions are only answered from the recordings and nothing else is available.
+    Snapshots are referred to by name like with Batfish, register_snapshot gives the hash
+    of the content of each name.
+    """
+
+    def __init__(self, recordings_dir, session=None):
+        """Initializer."""
+        self.recordings = AnswerCache(recordings_dir, max_bytes=float("inf"))
+        self.session = session
+        self.network = None
+        self.snapshot = None
+        self.snapshot_hashes = {}
+        self.q = Questions(self)
+
+    def __getattr__(self, name):
+        session = self.__dict__.get("session")
+        if session is None:
+            raise AttributeError(f"{name} needs a live Batfish service, BATFISH_MODE is replay")
+        return getattr(session, name)
+
+    def set_network(self, name):
+        """Set the current network."""
+        if self.session is not None:
+            self.session.set_network(name)
+        self.network = name
+        return name
+
+    def set_snapshot(self, name):
+        """Set the current snapshot, its content hash is given by register_snapshot."""
+        if self.session is not None:
+            self.session.set_snapshot(name)
+        self.snapshot = name
+        return name
+
+    def register_snapshot(self, name, snapshot_hash):
+        """Record and replay the answers of a snapshot name under the hash of its content."""
+        self.snapshot_hashes[name] = snapshot_hash
+
+    def _hash(self, snapshot):
+        try:
+            return self.snapshot_hashes[snapshot]
+        except KeyError:
+            raise ReplayMissError(f"No content hash registered for snapshot {snapshot}") from None
+
+    def _write_request(self, key, request):
+        # Written next to its final name and moved in place like the recorded frame
+        fd, tmp_path = tempfile.mkstemp(dir=self.recordings.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(request, file, indent=2, sort_keys=True, default=str)
+        os.replace(tmp_path, os.path.join(self.recordings.cache_dir, f"{key}.json"))
+
+    def answer(self, question, params, snapshot=None, reference_snapshot=None, **kwargs):
+        """Return the answer frame of `bf.q.<question>(**params)`, asked live when recording."""
+        snapshot = snapshot or self.snapshot
+        request = {"snapshot": snapshot, "question": question, "params": params}
+        key_params = dict(params)
+        if reference_snapshot:
+            request["reference_snapshot"] = reference_snapshot
+            key_params["reference_snapshot"] = self._hash(reference_snapshot)
+        key = self.recordings.key(self._hash(snapshot), question, key_params)
+
+        if self.session is None:
+            frame = self.recordings.get(key)
+            if frame is None:
+                asked = f"{question} {params}" if params else question
+                raise ReplayMissError(f"{asked} was not recorded on snapshot {snapshot}, run with BATFISH_MODE=record")
+            return frame
+
+        frame = (
+            getattr(self.session.q, question)(**params)
+            .answer(snapshot=snapshot, reference_snapshot=reference_snapshot, **kwargs)
+            .frame()
+        )
+        self.recordings.put(key, frame)
+        self._write_request(key, request)
+        return frame
+
+
+def session(host, recordings_dir, mode=MODE):
+    """Return the session of a mode: a pybatfish Session, or a RecordedSession recording or replaying it."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown BATFISH_MODE {mode}, expected one of {', '.join(MODES)}")
+    if mode == "replay":
+        return RecordedSession(recordings_dir)
+    live = Session(host=host)
+    return live if mode == "live" else RecordedSession(recordings_dir, live)
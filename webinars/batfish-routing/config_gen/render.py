@@ -0,0 +1,231 @@
+"""Render the configuration of every host from its template and host_vars, without Ansible."""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, StrictUndefined
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INVENTORY_FILE = os.path.join(BASE_DIR, "inventory.yml")
+HOST_VARS_DIR = os.path.join(BASE_DIR, "host_vars")
+TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+OUTPUT_DIR = os.path.join(BASE_DIR, "data", "configs")
+# Compiled templates, shared by the render processes and kept between runs
+BYTECODE_DIR = os.path.join(BASE_DIR, ".jinja_cache")
+# Hashes of the inputs and output of every host at its last render
+MANIFEST_FILE = os.path.join(BASE_DIR, ".render_manifest.json")
+# Inventory group rendered, the hosts of pb_generate_configs.yml
+HOSTS_GROUP = "webinar"
+
+
+def _walk_group(name, group, inherited_vars, inherited_groups, hosts):
+    """Collect the hosts of an inventory group with their variables, parent groups first like Ansible."""
+    group = group or {}
+    group_vars = {**inherited_vars, **(group.get("vars") or {})}
+    group_names = inherited_groups + [name]
+
+    for host, host_vars in (group.get("hosts") or {}).items():
+        current = hosts.setdefault(host, {"vars": {}, "groups": []})
+        current["vars"].update({**group_vars, **(host_vars or {})})
+        current["groups"].extend(group for group in group_names if group not in current["groups"])
+
+    for child, child_group in (group.get("children") or {}).items():
+        _walk_group(child, child_group, group_vars, group_names, hosts)
+
+
+def load_inventory(inventory_file=INVENTORY_FILE, host_vars_dir=HOST_VARS_DIR, hosts_group=HOSTS_GROUP):
+    """Return the variables of every host of a group, from the inventory and host_vars/<host>.yml."""
+    with open(inventory_file) as file:
+        inventory = yaml.safe_load(file)
+
+    hosts = {}
+    for name, group in inventory.items():
+        _walk_group(name, group, {}, [], hosts)
+
+    variables = {}
+    for host, details in hosts.items():
+        if hosts_group not in details["groups"]:
+            continue
+        host_vars = dict(details["vars"])
+        host_vars_file = os.path.join(host_vars_dir, f"{host}.yml")
+        if os.path.exists(host_vars_file):
+            with open(host_vars_file) as file:
+                host_vars.update(yaml.safe_load(file) or {})
+        host_vars["inventory_hostname"] = host
+        host_vars["group_names"] = sorted(group for group in details["groups"] if group != "all")
+        variables[host] = host_vars
+    return variables
+
+
+@functools.lru_cache(maxsize=None)
+def environment(templates_dir=TEMPLATES_DIR, bytecode_dir=BYTECODE_DIR):
+    """Jinja2 environment of this process, templates are compiled once and kept in its cache.
+
+    Compiled templates are also written to bytecode_dir, so a process only compiles the
+    role templates that changed since they were last loaded, whatever the number of hosts.
+    Same whitespace handling as the Ansible template module: block tags eat the newline
+    that follows them and the trailing newline of a template is kept.
+    """
+    os.makedirs(bytecode_dir, exist_ok=True)
+    return Environment(
+        loader=FileSystemLoader(templates_dir),
+        bytecode_cache=FileSystemBytecodeCache(bytecode_dir),
+        trim_blocks=True,
+        keep_trailing_newline=True,
+        undefined=StrictUndefined,
+        cache_size=-1,
+    )
+
+
+def template_name(host_vars):
+    """Role template rendering the configuration of a host, set by the template var of its inventory group."""
+    return host_vars["template"]
+
+
+def render_host(host_vars, templates_dir=TEMPLATES_DIR):
+    """Return the rendered configuration of a host."""
+    template = environment(templates_dir).get_template(template_name(host_vars))
+    return template.render(**host_vars)
+
+
+@functools.lru_cache(maxsize=None)
+def _template_hash(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def input_hash(host_vars, templates_dir=TEMPLATES_DIR):
+    """Hash of everything the configuration of a host is rendered from: its template and its variables."""
+    digest = hashlib.sha256(_template_hash(os.path.join(templates_dir, template_name(host_vars))).encode())
+    digest.update(json.dumps(host_vars, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _file_hash(path):
+    try:
+        with open(path, "rb") as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def _render_to_file(args):
+    """Render a host and return (host, status, output hash).
+
+    The status is "written", or "unchanged" when the file already had this content and
+    was left untouched. With check, it is "up to date" or "outdated" and nothing is written.
+    """
+    host, host_vars, templates_dir, output_dir, check = args
+    config = render_host(host_vars, templates_dir)
+    output_hash = hashlib.sha256(config.encode()).hexdigest()
+    path = os.path.join(output_dir, f"{host}.cfg")
+
+    if check:
+        return host, "up to date" if _file_hash(path) == output_hash else "outdated", output_hash
+
+    # Keep the modification time of configurations that did not change
+    if _file_hash(path) == output_hash:
+        return host, "unchanged", output_hash
+
+    with open(path, "w", newline="") as file:
+        file.write(config)
+    return host, "written", output_hash
+
+
+def _load_manifest(manifest_file):
+    try:
+        with open(manifest_file) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def render_all(
+    variables,
+    templates_dir=TEMPLATES_DIR,
+    output_dir=OUTPUT_DIR,
+    workers=None,
+    check=False,
+    manifest_file=MANIFEST_FILE,
+    force=False,
+):
+    """Render the hosts whose inputs changed since the last run in a process pool, return {host: status}.
+
+    Hosts whose template and variables hash like at their last render, and whose file
+    still holds that render, are "skipped". With check or force, every host is rendered.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _load_manifest(manifest_file)
+    results = {}
+    jobs = []
+    hashes = {}
+    for host, host_vars in sorted(variables.items()):
+        hashes[host] = input_hash(host_vars, templates_dir)
+        previous = manifest.get(host, {})
+        up_to_date = previous.get("inputs") == hashes[host] and _file_hash(
+            os.path.join(output_dir, f"{host}.cfg")
+        ) == previous.get("output")
+        if up_to_date and not (check or force):
+            results[host] = "skipped"
+        else:
+            jobs.append((host, host_vars, templates_dir, output_dir, check))
+
+    # Not worth starting processes for a single host
+    if workers == 1 or len(jobs) < 2:
+        rendered = list(map(_render_to_file, jobs))
+    else:
+        # Hand hosts out in chunks, a few per worker, to keep the pickling overhead low
+        chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rendered = list(executor.map(_render_to_file, jobs, chunksize=chunksize))
+
+    for host, status, output_hash in rendered:
+        results[host] = status
+        if not check:
+            manifest[host] = {"inputs": hashes[host], "output": output_hash}
+
+    if not check:
+        # Hosts no longer in the inventory are forgotten
+        manifest = {host: manifest[host] for host in variables if host in manifest}
+        with open(manifest_file, "w") as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+    return results
+
+
+def main():
+    """Render the configurations of the inventory."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=None, help="Number of render processes (default: CPU count)")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="Directory the configurations are written to")
+    parser.add_argument(
+        "--check", action="store_true", help="Only compare the rendered configurations with the existing files"
+    )
+    parser.add_argument("--force", action="store_true", help="Render every host, even when its inputs did not change")
+    args = parser.parse_args()
+
+    results = render_all(
+        load_inventory(), output_dir=args.output, workers=args.workers, check=args.check, force=args.force
+    )
+    statuses = list(results.values())
+    if args.check:
+        outdated = sorted(host for host, status in results.items() if status == "outdated")
+        for host in outdated:
+            print(f"{host}: rendered configuration differs from {host}.cfg")
+        print(f"{len(results) - len(outdated)} of {len(results)} configurations up to date.")
+        return 1 if outdated else 0
+
+    rendered = statuses.count("written") + statuses.count("unchanged")
+    print(
+        f"Rendered {rendered} hosts ({statuses.count('written')} written, {statuses.count('unchanged')} unchanged), "
+        f"skipped {statuses.count('skipped')} hosts with unchanged inputs."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
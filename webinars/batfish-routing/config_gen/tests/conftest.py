@@ -0,0 +1,121 @@
+"""Batfish snapshot shared by the routing tests, uploaded once per test run."""
+import json
+import logging
+import os
+
+import pytest
+from batfish_common.answer_cache import AnswerCache, hash_directory, hash_files
+from batfish_common.change_impact import ChangeImpact, ImpactSession, changed_files
+from batfish_common.replay import MODE, RecordedSession, session
+
+from routes_index import RoutesIndex
+
+logging.getLogger("pybatfish").setLevel(logging.WARN)
+BATFISH_HOST = os.getenv("BATFISH_HOST", "batfish")
+NETWORK = "webinar"
+SNAPSHOT_NAME = "snapshot-1"
+SNAPSHOT_DIR = "/local/data"
+# Answers are kept next to the generated configurations, so they survive the container
+ANSWER_CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", ".answer_cache")
+# Answers recorded with BATFISH_MODE=record, replayed with BATFISH_MODE=replay
+RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), "..", ".recordings")
+# Content of the snapshot tested by the last run and of the one before it
+SNAPSHOT_STATE_FILE = os.path.join(os.path.dirname(__file__), "..", ".snapshot_state.json")
+# A change of a node can change the answers of its neighbors over these sessions and adjacencies
+EDGE_QUESTIONS = ["bgpEdges", "layer3Edges"]
+
+
+def _load_snapshot_state():
+    try:
+        with open(SNAPSHOT_STATE_FILE) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _update_snapshot_state():
+    """Make the content of the snapshot directory the current snapshot, the last different one the previous."""
+    state = _load_snapshot_state()
+    files = hash_files(SNAPSHOT_DIR)
+    snapshot_hash = hash_directory(SNAPSHOT_DIR, files)
+    if state.get("current", {}).get("hash") != snapshot_hash:
+        state = {"previous": state.get("current", {}), "current": {"hash": snapshot_hash, "files": files}}
+        with open(SNAPSHOT_STATE_FILE, "w") as file:
+            json.dump(state, file, indent=2, sort_keys=True)
+
+
+def pytest_configure(config):
+    """Upload the snapshot from the main pytest process, before any xdist worker starts."""
+    # xdist workers have a workerinput attribute, the controller and runs without xdist do not
+    if hasattr(config, "workerinput") or config.option.collectonly:
+        return
+    _update_snapshot_state()
+    # Replayed answers need no snapshot, nor a Batfish service
+    if MODE == "replay":
+        return
+
+    print("=" * 20)
+    print("Starting Batfish Setup.....")
+    print("=" * 20)
+    bf = session(BATFISH_HOST, RECORDINGS_DIR, "live")
+    bf.set_network(NETWORK)
+    bf.init_snapshot(SNAPSHOT_DIR, name=SNAPSHOT_NAME, overwrite=True)
+
+
+@pytest.fixture(scope="session")
+def bf():
+    """Batfish session of this process, set to the snapshot uploaded for the run.
+
+    Questions are answered through the on-disk answer cache. When configurations changed
+    since the previous snapshot, the cached answers of the previous snapshot are kept for
+    the nodes the change does not affect, and Batfish is only asked about the changed
+    nodes and their BGP and layer 3 neighbors. With BATFISH_MODE set to record or replay,
+    answers are recorded or replayed for the content of the snapshot directory.
+    """
+    state = _load_snapshot_state()
+    current = state.get("current") or {"hash": hash_directory(SNAPSHOT_DIR), "files": {}}
+    previous = state.get("previous") or {}
+
+    live = session(BATFISH_HOST, RECORDINGS_DIR, MODE)
+    live.set_network(NETWORK)
+    live.set_snapshot(SNAPSHOT_NAME)
+    if isinstance(live, RecordedSession):
+        live.register_snapshot(SNAPSHOT_NAME, current["hash"])
+
+    # Recording asks every question, an answer read from the cache would not be recorded
+    cache = AnswerCache(ANSWER_CACHE_DIR, refresh=MODE == "record")
+
+    def answer(question):
+        return cache.frame(live, current["hash"], question)
+
+    # Asked on every run, so the next one can tell the nodes and neighbors of its changed files
+    for question in ["fileParseStatus", *EDGE_QUESTIONS]:
+        answer(question)
+    impact = None
+    # Recordings hold the answers of whole questions, only live sessions are asked about the affected nodes
+    if previous.get("hash") and MODE == "live":
+        changed = changed_files(previous["files"], current["files"])
+        impact = ChangeImpact.between(cache, answer, previous["hash"], changed, EDGE_QUESTIONS)
+    return ImpactSession(live, cache, current["hash"], impact)
+
+
+@pytest.fixture(scope="session")
+def answers(bf):
+    """Return a function answering `bf.q.<question>(**params)` through the on-disk answer cache."""
+
+    def answer(question, **params):
+        return bf.answer(question, params)
+
+    return answer
+
+
+@pytest.fixture(scope="session")
+def routes_index(answers):
+    """Index of the routes of every node, from a single routes answer."""
+    return RoutesIndex(answers("routes"))
+
+
+@pytest.fixture(scope="session")
+def bgp_edges(answers):
+    """BGP edges of every node, from a single bgpEdges answer to filter locally."""
+    return answers("bgpEdges")
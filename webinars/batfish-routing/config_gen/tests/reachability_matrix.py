@@ -0,0 +1,83 @@
+"""Declarative pod to service reachability matrix, checked with as few reachability questions as possible."""
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import yaml
+from pybatfish.datamodel.flow import HeaderConstraints, PathConstraints
+
+from routes_index import node_mask
+
+# Header fields of a service and the HeaderConstraints parameter each one maps to
+SERVICE_FIELDS = {"dst_ips": "dstIps", "ip_protocols": "ipProtocols", "dst_ports": "dstPorts"}
+# Flows looked for per expectation, any flow found is a violation of the intent
+VIOLATIONS = {"success": "failure", "failure": "success"}
+
+Intent = namedtuple("Intent", ["pod", "service", "expect"], defaults=["success"])
+# One reachability question: the shared headers, the flows looked for and the intents it answers
+Batch = namedtuple("Batch", ["headers", "actions", "intents"])
+
+
+class ReachabilityMatrix:
+    """Check the expected reachability of every (pod, service) intent of a YAML file.
+
+    Intents sharing the same source addresses, service headers and expectation only
+    differ by where flows start, so they are asked as one reachability question from
+    the union of their start locations. Duplicate intents are asked once. A violating
+    flow is mapped back to its intent by the node it entered the network at.
+    """
+
+    def __init__(self, pods, services, intents):
+        """Initializer."""
+        self.pods = pods
+        self.services = services
+        self.intents = list(dict.fromkeys(Intent(**intent) for intent in intents))
+        self.timings = []
+
+    @classmethod
+    def from_yaml(cls, path):
+        """Load the pods, services and intents of a YAML file."""
+        with open(path) as file:
+            data = yaml.safe_load(file)
+        return cls(data["pods"], data["services"], data["intents"])
+
+    def _headers(self, intent):
+        pod, service = self.pods[intent.pod], self.services[intent.service]
+        fields = {SERVICE_FIELDS[field]: value for field, value in service.items() if field in SERVICE_FIELDS}
+        return HeaderConstraints(srcIps=pod["src_ips"], **fields)
+
+    def batches(self):
+        """Group the intents into the reachability questions that answer them."""
+        groups = {}
+        for intent in self.intents:
+            headers = self._headers(intent)
+            key = (repr(headers), intent.expect)
+            groups.setdefault(key, Batch(headers, VIOLATIONS[intent.expect], []))[2].append(intent)
+        return list(groups.values())
+
+    def _ask(self, bf, batch):
+        locations = ",".join(dict.fromkeys(self.pods[intent.pod]["nodes"] for intent in batch.intents))
+        start = time.monotonic()
+        flows = bf.q.reachability(
+            pathConstraints=PathConstraints(startLocation=locations),
+            headers=batch.headers,
+            actions=batch.actions,
+        ).answer(snapshot=bf.snapshot).frame()
+        return flows, time.monotonic() - start
+
+    def run(self, bf):
+        """Ask every batch at the same time and return the pod by service matrix of pass/FAIL."""
+        batches = self.batches()
+        matrix = pd.DataFrame("", index=list(self.pods), columns=list(self.services))
+
+        with ThreadPoolExecutor(max_workers=len(batches) or 1) as executor:
+            answers = executor.map(lambda batch: self._ask(bf, batch), batches)
+            for batch, (flows, latency) in zip(batches, answers):
+                services = ", ".join(dict.fromkeys(intent.service for intent in batch.intents))
+                self.timings.append((services, len(batch.intents), latency))
+                ingress_nodes = pd.Series([flow.ingressNode for flow in flows["Flow"]] if len(flows) else [], dtype=str)
+                for intent in batch.intents:
+                    violated = node_mask(ingress_nodes, self.pods[intent.pod]["nodes"]).any()
+                    matrix.loc[intent.pod, intent.service] = "FAIL" if violated else "pass"
+        return matrix
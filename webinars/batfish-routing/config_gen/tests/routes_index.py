@@ -0,0 +1,56 @@
+"""Local index of a Batfish routes answer, queried without asking Batfish again."""
+import ipaddress
+
+import numpy as np
+
+
+def node_mask(nodes, spec):
+    """Return a boolean array of the nodes matching a node specifier.
+
+    Supports the forms used by the tests: a `/regex/` and comma separated node names,
+    both case insensitive like in Batfish.
+    """
+    if spec.startswith("/") and spec.endswith("/"):
+        return nodes.str.contains(spec[1:-1], case=False, regex=True).to_numpy()
+    names = [name.strip().lower() for name in spec.split(",")]
+    return nodes.str.lower().isin(names).to_numpy()
+
+
+class RoutesIndex:
+    """Routes of every node, from one `routes` answer, with vectorized lookups.
+
+    Networks are stored as arrays of integer addresses, masks and prefix lengths, so a
+    lookup by node, exact network, containment of an address or prefix and protocol is a
+    handful of NumPy operations over the whole table.
+    """
+
+    def __init__(self, routes):
+        """Initializer, from the frame of a `routes` answer."""
+        self.frame = routes.reset_index(drop=True)
+        networks = [ipaddress.IPv4Network(str(network)) for network in self.frame["Network"]]
+        self._address = np.array([int(network.network_address) for network in networks], dtype=np.uint32)
+        self._netmask = np.array([int(network.netmask) for network in networks], dtype=np.uint32)
+        self._length = np.array([network.prefixlen for network in networks], dtype=np.uint8)
+        self._protocol = self.frame["Protocol"].to_numpy()
+
+    def lookup(self, nodes=None, network=None, contains=None, protocol=None):
+        """Return the routes matching every given criteria.
+
+        nodes: node specifier, see node_mask()
+        network: prefix the route network must be equal to, like the network parameter of q.routes()
+        contains: address or prefix the route network must contain
+        protocol: protocol name, or list of names, of the route
+        """
+        mask = np.ones(len(self.frame), dtype=bool)
+        if nodes:
+            mask &= node_mask(self.frame["Node"], nodes)
+        if network:
+            network = ipaddress.IPv4Network(network)
+            mask &= (self._address == int(network.network_address)) & (self._length == network.prefixlen)
+        if contains:
+            target = ipaddress.IPv4Network(contains)
+            mask &= (np.uint32(int(target.network_address)) & self._netmask) == self._address
+            mask &= self._length <= target.prefixlen
+        if protocol:
+            mask &= np.isin(self._protocol, [protocol] if isinstance(protocol, str) else list(protocol))
+        return self.frame[mask]
@@ -1,79 +1,51 @@
-import logging
-import sys
+"""Routing validation of the generated configurations, run with pytest."""
+import os
 
+import pytest
 from pybatfish.client import asserts
-from pybatfish.client.commands import bf_session
-from pybatfish.datamodel.flow import HeaderConstraints
-from pybatfish.question import load_questions
 
-logging.getLogger("pybatfish").setLevel(logging.WARN)
-SNAPSHOT_DIR = '/local/data'
+from reachability_matrix import ReachabilityMatrix
+from routes_index import node_mask
 
+REACHABILITY_FILE = os.path.join(os.path.dirname(__file__), "reachability.yml")
 
-def setup():
-    bf_session.host = "batfish"
-    load_questions()
-    bf_session.set_network('webinar')
-    bf_session.init_snapshot(SNAPSHOT_DIR, name='snapshot-1', overwrite=True)
-    print("=" * 20)
-    print("Starting Batfish Setup.....")
-    print("=" * 20)
+PROTOCOL_ASSERTIONS = [
+    "assert_no_unestablished_bgp_sessions",
+    "assert_no_incompatible_bgp_sessions",
+    "assert_no_incompatible_ospf_sessions",
+]
 
 
-def test_protocols(assertion_str):
-    result = getattr(asserts, assertion_str)()
-    if not result:
-        sys.exit(1)
-    else:
-        print(f"Validated {assertion_str.title().replace('_', ' ')}")
+@pytest.mark.parametrize("assertion", PROTOCOL_ASSERTIONS)
+def test_protocols(bf, assertion):
+    """BGP and OSPF sessions are all established and compatible."""
+    assert getattr(asserts, assertion)(session=bf)
 
 
-def test_paths():
-    path_result = asserts.assert_flows_succeed(
-        startLocation="/sw-/",
-        headers=HeaderConstraints(dstIps='8.8.8.8', srcIps='192.168.1.0/24'),
-        snapshot="snapshot-1",
-        session=None
-    )
-    if not path_result:
-        sys.exit(1)
-    else:
-        print(f"Test from Desktop Pod to DNS has passed!")
+def test_paths(bf):
+    """Every pod to service intent of reachability.yml holds, Desktop Pod to DNS among them."""
+    reachability = ReachabilityMatrix.from_yaml(REACHABILITY_FILE)
+    matrix = reachability.run(bf)
+    print(matrix.to_string())
+    for services, intents, latency in reachability.timings:
+        print(f"{services}: {intents} intents in {latency:.2f}s")
+    assert not (matrix == "FAIL").any(axis=None), f"Reachability intents failed:\n{matrix.to_string()}"
 
 
-def test_custom_checks():
-    """
-    - Desktop pod has no routes to security servers.
-    - Route to DNS must be a OSPF E2 route from Desktop pod.
-    - All edge- devices must have a BGP session towards an ISP in Established state.
-    """
-    bf_routes = bf_session.q.routes().answer().frame()
-    result = asserts.assert_has_no_route(routes=bf_routes, expected_route="192.168.123.0/24", node="sw-1")
-    if not result:
-        sys.exit(1)
-    else:
-        print("Desktop pod has no routes to security servers. passed!")
-    dns_routes = bf_session.q.routes(nodes="/sw/", network="8.8.8.8/32").answer().frame()
-    if not dns_routes.Protocol.all() == "ospfE2":
-        sys.exit(1)
-    else:
-        print("Route to DNS must be a OSPF E2 route from Desktop pod. passed!")
-    isp_neighbors = bf_session.q.bgpEdges(nodes="/edge/", remoteNodes="/isp/").answer().frame()
-    isp_result = asserts.assert_num_results(isp_neighbors, 2)
-    if not isp_result:
-        sys.exit(1)
-    else:
-        print("There is always at least one BGP session towards an ISP in Established state. passed!")
+def test_no_route_to_security_servers(routes_index):
+    """Desktop pod has no routes to security servers."""
+    assert not routes_index.lookup(nodes="sw-1").empty, "No node: sw-1"
+    assert routes_index.lookup(nodes="sw-1", network="192.168.123.0/24").empty
 
 
-if __name__ == "__main__":
-    setup()
-    assert_list = [
-        "assert_no_unestablished_bgp_sessions",
-        "assert_no_incompatible_bgp_sessions",
-        "assert_no_incompatible_ospf_sessions"
-    ]
-    for assertion in assert_list:
-        test_protocols(assertion)
-    test_paths()
-    test_custom_checks()
+def test_dns_route_is_ospf_e2(routes_index):
+    """Route to DNS must be a OSPF E2 route from Desktop pod."""
+    dns_routes = routes_index.lookup(nodes="/sw/", network="8.8.8.8/32")
+    assert not dns_routes.empty
+    assert (dns_routes.Protocol == "ospfE2").all()
+
+
+def test_bgp_sessions_to_isp(bgp_edges):
+    """All edge- devices must have a BGP session towards an ISP in Established state."""
+    isp_neighbors = bgp_edges[node_mask(bgp_edges.Node, "/edge/") & node_mask(bgp_edges.Remote_Node, "/isp/")]
+    assert asserts.assert_num_results(isp_neighbors, 2)
@@ -225,23 +225,23 @@ def yamllint(context):
 
 @task
 def generate_configurations(context):
-    """Run ansible playbook to generate configurations
+    """Render the configurations of every host from its template and host_vars
     Args:
         context (obj): Used to run specific commands
         local (bool): Define as `True` to execute locally
     """
-    exec_cmd = "ansible-playbook /local/config_gen/pb_generate_configs.yml -i /local/config_gen/inventory.yml"
+    exec_cmd = "python /local/config_gen/render.py"
     run_command(context, exec_cmd)
 
 
 @task
 def test_configurations(context):
-    """Run ansible playbook to generate configurations
+    """Run the Batfish routing tests in parallel, with a JUnit report and the duration of every test
     Args:
         context (obj): Used to run specific commands
         local (bool): Define as `True` to execute locally
     """
-    exec_cmd = "python /local/config_gen/tests/test_routing.py"
+    exec_cmd = "pytest /local/config_gen/tests -n auto --junitxml=/local/config_gen/junit.xml --durations=0"
     run_command(context, exec_cmd)
 
 
@@ -0,0 +1,514 @@
+"""Local pre-screen of unreachable ACL lines, so filterLineReachability only runs where it is needed.
+
+Every line of the IOS and ASA access-lists under data/configs becomes a set of boxes:
+source and destination prefixes plus protocol, source port and destination port intervals,
+stored as integer NumPy arrays. A line is decided locally when it references an undefined
+object (independently unmatchable, like Batfish), when each of its boxes is contained in
+the box of a single earlier line (blocked), or when none of its boxes overlaps an earlier
+one (reachable). Everything else, and the filters of other vendors, is left to Batfish.
+A filter left to Batfish is answered by Batfish alone, for all of its lines, and every
+filter of a node is when the node has filters the screen does not parse (IPv6 or MAC
+ACLs, named ACLs without a kind, ...).
+"""
+import argparse
+import functools
+import glob
+import ipaddress
+import itertools
+import os
+import re
+import socket
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from config_index import CONFIGS_DIR, DETECT_LINES, acl_type, detect_vendor
+
+# Boxes a line may expand to before it is left to Batfish
+MAX_BOXES = 256
+ALL_PORTS = (0, 65535)
+ALL_PROTOCOLS = (0, 255)
+# Relative margin of the overlap volumes, which are floats, before a line is proven reachable
+VOLUME_MARGIN = 1e-9
+# Network mask of each prefix length
+MASKS = np.array([(0xFFFFFFFF << (32 - length)) & 0xFFFFFFFF for length in range(33)], dtype=np.int64)
+
+PROTOCOLS = {
+    "icmp": 1, "igmp": 2, "tcp": 6, "udp": 17, "gre": 47, "esp": 50, "ahp": 51, "ah": 51,
+    "eigrp": 88, "ospf": 89, "pim": 103, "vrrp": 112, "sctp": 132,
+}
+PORTS = {
+    "echo": 7, "discard": 9, "daytime": 13, "chargen": 19, "ftp-data": 20, "ftp": 21, "ssh": 22, "telnet": 23,
+    "smtp": 25, "time": 37, "nameserver": 42, "whois": 43, "tacacs": 49, "domain": 53, "bootps": 67,
+    "bootpc": 68, "tftp": 69, "gopher": 70, "finger": 79, "www": 80, "http": 80, "hostname": 101, "pop2": 109,
+    "pop3": 110, "sunrpc": 111, "ident": 113, "nntp": 119, "ntp": 123, "netbios-ns": 137, "netbios-dgm": 138,
+    "netbios-ss": 139, "netbios-ssn": 139, "imap4": 143, "snmp": 161, "snmptrap": 162, "bgp": 179, "irc": 194,
+    "ldap": 389, "https": 443, "isakmp": 500, "syslog": 514, "lpd": 515, "talk": 517, "rip": 520,
+    "klogin": 543, "kshell": 544, "ldaps": 636, "non500-isakmp": 4500,
+}
+# Trailing keywords that do not narrow what a line matches
+NEUTRAL_KEYWORDS = {"log", "log-input"}
+# Top level commands of filters that are not parsed, Batfish is asked about every filter of their node
+UNSCREENED_FILTERS = (["ipv6", "access-list"], ["mac", "access-list"], ["zone-pair", "security"])
+
+HOSTNAME_PATTERNS = {
+    "cisco_ios": re.compile(r"^hostname (\S+)"),
+    "cisco_asa": re.compile(r"^hostname (\S+)"),
+    "juniper": re.compile(r"^set system host-name (\S+)"),
+    "paloalto": re.compile(r"^set deviceconfig system hostname (\S+)"),
+}
+
+# A parsed ACL line: boxes is a list of (src, dst, protocol, source ports, destination ports), exact is
+# False when the line has qualifiers the boxes do not model (ICMP types, established, ...), so it may
+# match less than its boxes and cannot block other lines
+AclLine = namedtuple("AclLine", ["text", "action", "boxes", "exact", "reason"])
+# Lines decided locally and the filters left to Batfish, {node: set of filter names or None for all}.
+# The lines of a filter left to Batfish are not in the frame, Batfish reports them.
+ScreenResult = namedtuple("ScreenResult", ["frame", "undecided", "lines", "decided"])
+
+UNDEFINED = "INDEPENDENTLY_UNMATCHABLE"
+UNDECIDED = "UNDECIDED"
+
+
+class _Undecidable(Exception):
+    """A line the boxes cannot represent exactly."""
+
+
+class _Undefined(Exception):
+    """A line referencing an object that is not defined."""
+
+
+@functools.lru_cache(maxsize=65536)
+def _address_int(text):
+    if text.count(".") != 3:
+        raise _Undecidable(f"address {text}")
+    return int.from_bytes(socket.inet_aton(text), "big")
+
+
+def _prefix(address, mask, wildcard):
+    """Return (address, length) of an address and mask, or wildcard on IOS."""
+    address, mask = _address_int(address), _address_int(mask)
+    hosts = mask if wildcard else mask ^ 0xFFFFFFFF
+    if hosts & (hosts + 1):
+        raise _Undecidable(f"non contiguous mask {mask}")
+    length = 32 - hosts.bit_length()
+    return address & int(MASKS[length]), length
+
+
+def _range_prefixes(first, last):
+    return [
+        (int(network.network_address), network.prefixlen)
+        for network in ipaddress.summarize_address_range(ipaddress.IPv4Address(first), ipaddress.IPv4Address(last))
+    ]
+
+
+def _port(token):
+    if token.isdigit():
+        return int(token)
+    if token in PORTS:
+        return PORTS[token]
+    raise _Undecidable(f"unknown port {token}")
+
+
+class _Objects:
+    """Network objects and object-groups of an ASA configuration, resolved to prefixes."""
+
+    def __init__(self):
+        self.defined = set()
+        self.networks = {}
+        self.groups = {}
+
+    def add(self, block, tokens):
+        """Record the member line of an object or object-group block."""
+        kind, name = block[:2]
+        if kind == "object network":
+            if tokens[0] == "host":
+                self.networks.setdefault(name, []).append(("prefix", (tokens[1], "255.255.255.255")))
+            elif tokens[0] == "subnet":
+                self.networks.setdefault(name, []).append(("prefix", tuple(tokens[1:3])))
+            elif tokens[0] == "range":
+                self.networks.setdefault(name, []).append(("range", tuple(tokens[1:3])))
+            else:
+                self.networks.setdefault(name, []).append(("opaque", tokens))
+        elif kind == "object-group network":
+            self.groups.setdefault(name, []).append(tokens)
+
+    def network(self, name):
+        if name not in self.defined:
+            raise _Undefined(name)
+        if name not in self.networks:
+            raise _Undecidable(f"object {name}")
+        prefixes = []
+        for kind, value in self.networks[name]:
+            if kind == "prefix":
+                prefixes.append(_prefix(*value, wildcard=False))
+            elif kind == "range":
+                prefixes.extend(_range_prefixes(*value))
+            else:
+                raise _Undecidable(f"object {name}")
+        return prefixes
+
+    def group(self, name, seen=()):
+        if name not in self.defined:
+            raise _Undefined(name)
+        if name not in self.groups:
+            raise _Undecidable(f"object-group {name}")
+        prefixes = []
+        for tokens in self.groups[name]:
+            if tokens[:2] == ["network-object", "host"]:
+                prefixes.append(_prefix(tokens[2], "255.255.255.255", wildcard=False))
+            elif tokens[:2] == ["network-object", "object"]:
+                prefixes.extend(self.network(tokens[2]))
+            elif tokens[0] == "network-object" and len(tokens) == 3:
+                prefixes.append(_prefix(tokens[1], tokens[2], wildcard=False))
+            elif tokens[0] == "group-object" and tokens[1] not in seen:
+                prefixes.extend(self.group(tokens[1], seen + (name,)))
+            elif tokens[0] != "description":
+                raise _Undecidable(f"object-group {name}")
+        return prefixes
+
+
+def _address(tokens, position, objects, wildcard):
+    """Return the prefixes of the address at position and the next position."""
+    token = tokens[position]
+    if token in ("any", "any4"):
+        return [(0, 0)], position + 1
+    if token == "host":
+        return [_prefix(tokens[position + 1], "255.255.255.255", wildcard=False)], position + 2
+    if token == "object":
+        return objects.network(tokens[position + 1]), position + 2
+    if token == "object-group":
+        return objects.group(tokens[position + 1]), position + 2
+    if token in ("any6", "interface") or ":" in token or "/" in token:
+        raise _Undecidable(token)
+    return [_prefix(token, tokens[position + 1], wildcard)], position + 2
+
+
+def _ports(tokens, position):
+    """Return the port intervals at position and the next position."""
+    if position >= len(tokens):
+        return [ALL_PORTS], position
+    token = tokens[position]
+    if token == "eq":
+        port = _port(tokens[position + 1])
+        return [(port, port)], position + 2
+    if token == "neq":
+        port = _port(tokens[position + 1])
+        return [interval for interval in ((0, port - 1), (port + 1, 65535)) if interval[0] <= interval[1]], position + 2
+    if token == "lt":
+        return [(0, _port(tokens[position + 1]) - 1)], position + 2
+    if token == "gt":
+        return [(_port(tokens[position + 1]) + 1, 65535)], position + 2
+    if token == "range":
+        return [(_port(tokens[position + 1]), _port(tokens[position + 2]))], position + 3
+    if token == "object-group":
+        raise _Undecidable("service object-group")
+    return [ALL_PORTS], position
+
+
+def parse_entry(tokens, kind, objects, wildcard):
+    """Parse the tokens of an ACL entry, from its action, into an AclLine."""
+    text = " ".join(tokens)
+    action = tokens[0].upper()
+    try:
+        if kind == "standard":
+            sources, _ = _address(tokens, 1, objects, wildcard) if len(tokens) > 2 or tokens[1] == "any" else (
+                [_prefix(tokens[1], "0.0.0.0", wildcard=True)], 2
+            )
+            boxes = [(src, (0, 0), ALL_PROTOCOLS, ALL_PORTS, ALL_PORTS) for src in sources]
+            return AclLine(text, action, boxes, True, None)
+
+        protocol = tokens[1]
+        if protocol in ("object", "object-group"):
+            # Service objects are resolved by Batfish, undefined ones never match
+            if tokens[2] not in objects.defined:
+                raise _Undefined(tokens[2])
+            raise _Undecidable("service object")
+        if protocol == "ip":
+            protocols = ALL_PROTOCOLS
+        elif protocol.isdigit():
+            protocols = (int(protocol), int(protocol))
+        elif protocol in PROTOCOLS:
+            protocols = (PROTOCOLS[protocol], PROTOCOLS[protocol])
+        else:
+            raise _Undecidable(f"protocol {protocol}")
+        has_ports = protocol in ("tcp", "udp")
+
+        sources, position = _address(tokens, 2, objects, wildcard)
+        source_ports, position = _ports(tokens, position) if has_ports else ([ALL_PORTS], position)
+        destinations, position = _address(tokens, position, objects, wildcard)
+        destination_ports, position = _ports(tokens, position) if has_ports else ([ALL_PORTS], position)
+        # ICMP types, established, dscp, time-range... match less than the boxes, log options do not
+        qualifiers = tokens[position:]
+        if "log" in qualifiers:
+            qualifiers = qualifiers[: qualifiers.index("log")]
+        exact = all(token in NEUTRAL_KEYWORDS for token in qualifiers) and "time-range" not in tokens
+
+        boxes = list(itertools.product(sources, destinations, [protocols], source_ports, destination_ports))
+        if len(boxes) > MAX_BOXES:
+            raise _Undecidable("too many boxes")
+        return AclLine(text, action, boxes, exact, None)
+    except _Undefined:
+        return AclLine(text, action, [], True, UNDEFINED)
+    except (_Undecidable, IndexError, ValueError, OSError):
+        return AclLine(text, action, [], False, UNDECIDED)
+
+
+def parse_acls(path):
+    """Return the vendor, hostname, {ACL name: [AclLine]} and unparsed filters of a configuration file, in one pass."""
+    with open(path, errors="replace") as file:
+        lines = (line.rstrip("\n") for line in file)
+        head = list(itertools.islice(lines, DETECT_LINES))
+        vendor = detect_vendor(head)
+        hostname = None
+        entries = {}
+        unscreened = set()
+        objects = _Objects()
+        block = []
+        for text in itertools.chain(head, lines):
+            tokens = text.split()
+            if not tokens:
+                continue
+            if hostname is None and HOSTNAME_PATTERNS[vendor].match(text):
+                hostname = HOSTNAME_PATTERNS[vendor].match(text).group(1).lower()
+            if vendor not in ("cisco_ios", "cisco_asa") or "inactive" in tokens:
+                continue
+            if not text[0].isspace():
+                block = tokens
+                if any(tokens[: len(command)] == command for command in UNSCREENED_FILTERS):
+                    unscreened.add(" ".join(tokens))
+                    continue
+                if tokens[0] in ("object", "object-group") and len(tokens) > 2:
+                    block = [f"{tokens[0]} {tokens[1]}", tokens[2]]
+                    objects.defined.add(tokens[2])
+                    continue
+            elif block and block[0].startswith("object"):
+                objects.add(block, tokens)
+                continue
+
+            if tokens[0] == "access-list" and len(tokens) > 3:
+                rest = tokens[2:]
+                if rest[0] == "line":
+                    rest = rest[2:]
+                kind = rest[0] if rest[0] in ("standard", "extended") else None
+                rest = rest[1:] if kind else rest
+                acl = acl_type(tokens[1], kind)
+                if acl and rest[0] in ("permit", "deny"):
+                    entries.setdefault(tokens[1], []).append((acl.split()[0], rest))
+                elif rest[0] != "remark":
+                    # Named ACLs without a kind, ethertype, webtype...
+                    unscreened.add(tokens[1])
+            elif block[:2] == ["ip", "access-list"] and len(block) > 3 and text[0].isspace():
+                if tokens[0].isdigit():
+                    tokens = tokens[1:]
+                if tokens and tokens[0] in ("permit", "deny"):
+                    entries.setdefault(block[3], []).append((block[2], tokens))
+
+    # Batfish names a node without hostname after its file
+    hostname = hostname or os.path.splitext(os.path.basename(path))[0].lower()
+    wildcard = vendor != "cisco_asa"
+    acls = {
+        name: [parse_entry(tokens, kind, objects, wildcard) for kind, tokens in acl_entries]
+        for name, acl_entries in entries.items()
+    }
+    return vendor, hostname, acls, unscreened
+
+
+class _Boxes:
+    """Boxes of the lines of one ACL as parallel integer arrays, with a trie of their source prefixes."""
+
+    def __init__(self, lines):
+        rows = [
+            (number, src[0], src[1], dst[0], dst[1], *protocols, *source_ports, *destination_ports, line.exact)
+            for number, line in enumerate(lines)
+            for src, dst, protocols, source_ports, destination_ports in line.boxes
+        ]
+        table = np.array(rows, dtype=np.int64).reshape(-1, 12)
+        (
+            self.line, self.src, self.src_len, self.dst, self.dst_len, self.proto_lo, self.proto_hi,
+            self.sport_lo, self.sport_hi, self.dport_lo, self.dport_hi, exact,
+        ) = table.T
+        self.exact = exact.astype(bool)
+        # Source prefix -> ids of its boxes, the boxes whose source contains a prefix are its ancestors
+        self.by_source = {}
+        for box, key in enumerate(zip(self.src.tolist(), self.src_len.tolist())):
+            self.by_source.setdefault(key, []).append(box)
+        self.by_source = {key: np.array(boxes) for key, boxes in self.by_source.items()}
+        self.lengths = sorted({length for _, length in self.by_source})
+        # Boxes sorted by source address, the boxes whose source is inside a prefix are a slice of them
+        self.order = np.argsort(self.src, kind="stable")
+        self.sorted_src = self.src[self.order]
+
+    def ancestors(self, box, before):
+        """Ids of the boxes before `before` whose source prefix contains the source of box."""
+        address, length = int(self.src[box]), int(self.src_len[box])
+        found = [
+            self.by_source.get((address & int(MASKS[parent]), parent))
+            for parent in self.lengths
+            if parent <= length
+        ]
+        found = [boxes[boxes < before] for boxes in found if boxes is not None]
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def overlapping_sources(self, box, before):
+        """Ids of the boxes before `before` whose source prefix overlaps the source of box."""
+        address, length = int(self.src[box]), int(self.src_len[box])
+        last = address | (~int(MASKS[length]) & 0xFFFFFFFF)
+        inside = self.order[np.searchsorted(self.sorted_src, address) : np.searchsorted(self.sorted_src, last, "right")]
+        return np.union1d(self.ancestors(box, before), inside[inside < before])
+
+    def contain(self, box, candidates):
+        """Candidates that exactly contain box, the source is already known to contain it."""
+        c = candidates[self.exact[candidates]]
+        if not len(c):
+            return c
+        return c[
+            (self.dst_len[c] <= self.dst_len[box])
+            & ((self.dst[box] & MASKS[self.dst_len[c]]) == self.dst[c])
+            & (self.proto_lo[c] <= self.proto_lo[box]) & (self.proto_hi[c] >= self.proto_hi[box])
+            & (self.sport_lo[c] <= self.sport_lo[box]) & (self.sport_hi[c] >= self.sport_hi[box])
+            & (self.dport_lo[c] <= self.dport_lo[box]) & (self.dport_hi[c] >= self.dport_hi[box])
+        ]
+
+    def _overlap(self, lo, hi, box, c):
+        return np.maximum(0, np.minimum(hi[c], hi[box]) - np.maximum(lo[c], lo[box]) + 1).astype(float)
+
+    def volume(self, box):
+        """Number of packets, as a float, a box matches."""
+        return float(
+            2.0 ** (32 - self.src_len[box]) * 2.0 ** (32 - self.dst_len[box])
+            * (self.proto_hi[box] - self.proto_lo[box] + 1)
+            * (self.sport_hi[box] - self.sport_lo[box] + 1)
+            * (self.dport_hi[box] - self.dport_lo[box] + 1)
+        )
+
+    def overlap_volume(self, box, candidates):
+        """Sum of the volumes of the intersections of box with candidates whose source overlaps it.
+
+        The union of the candidates covers at most this much of box, so a sum below the
+        volume of box proves some of its packets are matched by none of them.
+        """
+        c = candidates
+        if not len(c):
+            return 0.0
+        # Overlapping prefixes are nested, their intersection is the longest one
+        src = 2.0 ** (32 - np.maximum(self.src_len[c], self.src_len[box]))
+        shortest = MASKS[np.minimum(self.dst_len[c], self.dst_len[box])]
+        nested = (self.dst[c] & shortest) == (self.dst[box] & shortest)
+        dst = np.where(nested, 2.0 ** (32 - np.maximum(self.dst_len[c], self.dst_len[box])), 0.0)
+        return float(np.sum(
+            src * dst
+            * self._overlap(self.proto_lo, self.proto_hi, box, c)
+            * self._overlap(self.sport_lo, self.sport_hi, box, c)
+            * self._overlap(self.dport_lo, self.dport_hi, box, c)
+        ))
+
+
+def screen_acl(lines):
+    """Decide the lines of one ACL, return {line number: (reason, blocking line numbers)}.
+
+    Lines missing from the result are reachable, UNDECIDED lines are left to Batfish. A line
+    is reachable as soon as one of its boxes has packets no earlier line can match, which
+    the sum of the overlaps of the box with the earlier boxes proves without building
+    their union.
+    """
+    boxes = _Boxes(lines)
+    first_box = np.searchsorted(boxes.line, np.arange(len(lines) + 1))
+    results = {}
+    # Once a line is not represented, whether later lines overlap it is unknown
+    opaque = False
+    for number, line in enumerate(lines):
+        if line.reason:
+            results[number] = (line.reason, [])
+            opaque = opaque or line.reason == UNDECIDED
+            continue
+
+        before = first_box[number]
+        blocking, covered, reachable = set(), True, False
+        for box in range(before, first_box[number + 1]):
+            containing = boxes.contain(box, boxes.ancestors(box, before))
+            if len(containing):
+                blocking.add(int(boxes.line[containing.min()]))
+                continue
+            covered = False
+            overlap = boxes.overlap_volume(box, boxes.overlapping_sources(box, before))
+            if not opaque and overlap < boxes.volume(box) * (1 - VOLUME_MARGIN):
+                reachable = True
+                break
+        if covered:
+            results[number] = ("BLOCKING_LINES", sorted(blocking))
+        elif not reachable:
+            # Several earlier lines may cover the line together
+            results[number] = (UNDECIDED, [])
+    return results
+
+
+def _screen_file(path):
+    vendor, hostname, acls, unscreened = parse_acls(path)
+    results = {name: screen_acl(lines) for name, lines in acls.items()}
+    total = sum(len(lines) for lines in acls.values())
+    # Filters of the other vendors, and of files with filters that are not parsed, are all left to Batfish
+    if vendor not in ("cisco_ios", "cisco_asa") or unscreened:
+        return hostname, [], None, total, 0
+
+    undecided = {
+        name for name, acl_results in results.items() if any(reason == UNDECIDED for reason, _ in acl_results.values())
+    }
+    rows, decided = [], 0
+    for name, lines in acls.items():
+        # Batfish answers every line of the filters it is asked about
+        if name in undecided:
+            continue
+        decided += len(lines)
+        for number, (reason, blocking) in sorted(results[name].items()):
+            line = lines[number]
+            actions = {lines[blocker].action for blocker in blocking}
+            rows.append([
+                [f"{hostname}: {name}"],
+                line.text,
+                line.action,
+                [lines[blocker].text for blocker in blocking],
+                any(action != line.action for action in actions),
+                reason,
+                None,
+            ])
+    return hostname, rows, undecided, total, decided
+
+
+def screen_configs(configs_dir=CONFIGS_DIR):
+    """Screen the ACLs of every configuration of a directory."""
+    rows, undecided, total, decided = [], {}, 0, 0
+    for path in sorted(glob.glob(os.path.join(configs_dir, "*"))):
+        hostname, file_rows, file_undecided, file_total, file_decided = _screen_file(path)
+        rows.extend(file_rows)
+        total += file_total
+        decided += file_decided
+        if file_undecided is None or file_undecided:
+            undecided[hostname] = file_undecided
+    columns = [
+        "Sources", "Unreachable_Line", "Unreachable_Line_Action", "Blocking_Lines", "Different_Action", "Reason",
+        "Additional_Info",
+    ]
+    return ScreenResult(pd.DataFrame(rows, columns=columns), undecided, total, decided)
+
+
+def main():
+    """Screen the ACLs and print the lines decided locally and the filters left to Batfish."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--configs", default=CONFIGS_DIR, help="Directory of the configurations")
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    result = screen_configs(args.configs)
+    elapsed = time.monotonic() - start
+    with pd.option_context("display.max_rows", None, "display.width", 200, "display.max_colwidth", 80):
+        print(result.frame.to_string())
+    for node, filters in sorted(result.undecided.items(), key=lambda item: str(item[0])):
+        print(f"Left to Batfish on {node}: {', '.join(sorted(filters)) if filters else 'all filters'}")
+    print(f"{result.decided} of {result.lines} ACL lines decided locally in {elapsed:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
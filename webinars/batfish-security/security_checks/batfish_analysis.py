@@ -1,9 +1,37 @@
 """Batfish Webinar 1."""
-from datetime import date
+import argparse
+from collections import Counter
 
-from pybatfish.client.session import Session
+import pandas as pd
+from batfish_common.answer_cache import AnswerCache
+from batfish_common.change_impact import NODE_COLUMNS, ChangeImpact, changed_files, node_specifier
+from batfish_common.replay import MODE, RecordedSession, session
+
+from acl_shadowing import screen_configs
+from config_index import CONFIGS_DIR
+from question_runner import Question, run_questions
+from reports import ReportWriter
+from snapshots import SnapshotManager
 
 SNAPSHOT_DIR = '../data/'
+ANSWER_CACHE_DIR = '../.answer_cache/'
+# Answers recorded with BATFISH_MODE=record, replayed with BATFISH_MODE=replay
+RECORDINGS_DIR = '../.recordings/'
+# Baseline snapshot of differential runs, uploaded and reused like the analyzed snapshot
+BASELINE_SNAPSHOT = 'baseline'
+BASELINE_MANIFEST_FILE = '../.baseline_manifest.json'
+# Values of the KeyPresence column of a differential answer, and the change of the finding they are
+CHANGES = {"Only in Snapshot": "added", "Only in Reference": "removed"}
+
+# Questions asked on every run, add a Question here to get its answer saved as well
+QUESTIONS = [
+    # Unused Structures
+    Question("unusedStructures", report="unused_structures"),
+    # Undefined references
+    Question("undefinedReferences", report="undefined_references"),
+    # Unreachable lines in ACLs/Policies
+    Question("filterLineReachability", report="unreachable_lines"),
+]
 
 
 class BatfishWebinar:
@@ -11,48 +39,214 @@ class BatfishWebinar:
 
     def __init__(self, bf_host, bf_network, bf_snapshot):
         """Initializer."""
+        self.snapshots = None
+        self.latencies = {}
+        self.cached = set()
+        self.acl_screen = None
+        self.impact = None
+        self.reports = ReportWriter()
+        # Recording asks every question, an answer read from the cache would not be recorded
+        self.answers = AnswerCache(ANSWER_CACHE_DIR, refresh=MODE == "record")
         self.bf_session = self._bf_setup(bf_host, bf_network, bf_snapshot)
 
     def _bf_setup(self, host, network, snapshot):
-        """Simple Pybatfish Setup."""
-        bf = Session(host=host)
+        """Simple Pybatfish Setup, uploading the configs only when they changed since the last run.
+
+        When replaying (BATFISH_MODE=replay), nothing is uploaded and no Batfish service is needed.
+        """
+        bf = session(host, RECORDINGS_DIR, MODE)
         bf.set_network(network)
-        bf.init_snapshot(SNAPSHOT_DIR, name=snapshot, overwrite=True)
-        bf.set_snapshot(snapshot)
+        self.snapshots = SnapshotManager(bf, SNAPSHOT_DIR)
+        if MODE == "replay":
+            snapshot = self.snapshots.replay(snapshot)
+        else:
+            snapshot = self.snapshots.setup(snapshot)
+        if isinstance(bf, RecordedSession):
+            bf.register_snapshot(snapshot, self.snapshots.digest)
         return bf
 
-    @staticmethod
-    def _save_to_html(answer_df, filename):
-        with open(f"../batfish_results/{filename}", "w") as file:
-            file.write(f"<h1>Today's date: {date.today()}</h1>")
-            file.write(answer_df.to_html())
+    def _change_impact(self):
+        """Nodes affected by the change since the previous snapshot, None on a first run or when it is unknown.
 
-    def _get_unused_structures(self):
-        """Query Batfish to get Unused Structures."""
-        return self._save_to_html(self.bf_session.q.unusedStructures().answer().frame(), filename="unused_structures.html")
+        The node of every configuration file is asked on every run, so the next one can
+        tell which nodes its changed files belonged to. Questions are only scoped to the
+        affected nodes when asked live, recordings hold the answers of whole questions.
+        """
+        digest, previous = self.snapshots.digest, self.snapshots.previous
+        self.answers.frame(self.bf_session, digest, "fileParseStatus")
+        if MODE != "live" or previous.get("digest") in (None, digest):
+            return None
+        return ChangeImpact.between(
+            self.answers,
+            lambda question: self.answers.frame(self.bf_session, digest, question),
+            previous["digest"],
+            changed_files(previous.get("files", {}), self.snapshots.files),
+        )
 
-    def _get_undefined_references(self):
-        """Query Batfish for undefined references."""
-        return self._save_to_html(self.bf_session.q.undefinedReferences().answer().frame(), filename="undefined_references.html")
+    def _screen_acls(self, questions):
+        """Decide the ACL lines the local engine can, return the questions left and the local findings.
 
-    def _get_unreachable_lines(self):
-        """Query Batfish for unreachable lines in ACLs/Policies."""
-        return self._save_to_html(self.bf_session.q.filterLineReachability().answer().frame(), filename="unreachable_lines.html")
+        filterLineReachability is only asked for the filters the screen left to Batfish, and
+        its answers are merged with the local findings in the same report. The local findings
+        only cover the other filters, so no line is reported twice.
+        """
+        screened, local = [], {}
+        for question in questions:
+            if question.name != "filterLineReachability" or question.params:
+                screened.append(question)
+                continue
+            self.acl_screen = screen_configs(CONFIGS_DIR)
+            local[question.report] = self.acl_screen.frame
+            for node, filters in sorted(self.acl_screen.undecided.items()):
+                params = {"nodes": node}
+                if filters:
+                    params["filters"] = ",".join(f'"{name}"' for name in sorted(filters))
+                screened.append(question._replace(params=params))
+        return screened, local
 
-    def execute_bf_questions(self):
-        """Execute Webinar Questions."""
+    def execute_bf_questions(self, questions=QUESTIONS):
+        """Execute Webinar Questions concurrently, saving each report as soon as all its answers are in."""
+        errors = []
         try:
-            self._get_unused_structures()
-            self._get_undefined_references()
-            self._get_unreachable_lines()
-            return "Successfully Queried Batfish."
+            self.impact = self._change_impact()
+            questions, frames = self._screen_acls(questions)
+            frames = {report: [frame] for report, frame in frames.items()}
+            pending = Counter(question.report for question in questions)
+            for report in [report for report in frames if not pending[report]]:
+                self.reports.write(report, frames.pop(report)[0])
+
+            for result in run_questions(
+                self.bf_session, questions, cache=self.answers, snapshot_hash=self.snapshots.digest, impact=self.impact
+            ):
+                name = result.question.name
+                # Scoped questions run at the same time, the slowest one is the latency of the question
+                self.latencies[name] = max(self.latencies.get(name, 0), result.latency)
+                if result.cached:
+                    self.cached.add(name)
+                if result.error:
+                    errors.append(result.error)
+                    continue
+                report = result.question.report
+                frames.setdefault(report, []).append(result.frame)
+                pending[report] -= 1
+                if not pending[report]:
+                    self.reports.write(report, pd.concat(frames.pop(report), ignore_index=True))
+            self.reports.write_index()
         except Exception as err:
-            return f"Error Occurred {err}"
+            errors.append(err)
+
+        if errors:
+            return f"Error Occurred {errors[0]}"
+        return "Successfully Queried Batfish."
+
+    def _setup_baseline(self, baseline_dir):
+        """Upload the baseline snapshot when it changed, return its name and content digest.
+
+        The node of every file of the baseline is asked, to tell the nodes that differ from it.
+        """
+        candidate = self.bf_session.snapshot
+        baseline = SnapshotManager(self.bf_session, baseline_dir, BASELINE_MANIFEST_FILE)
+        name = baseline.replay(BASELINE_SNAPSHOT) if MODE == "replay" else baseline.setup(BASELINE_SNAPSHOT)
+        if isinstance(self.bf_session, RecordedSession):
+            self.bf_session.register_snapshot(name, baseline.digest)
+        self.answers.frame(self.bf_session, baseline.digest, "fileParseStatus")
+        self.bf_session.set_snapshot(candidate)
+        return name, baseline
+
+    def execute_bf_diff(self, baseline_dir, questions=QUESTIONS):
+        """Save `<report>_diff` reports of the findings added or removed since the baseline snapshot.
+
+        Every question is answered differentially by Batfish against the baseline, scoped to
+        the nodes whose configuration differs from it, so the questions and the reports grow
+        with the size of the change rather than the network.
+        """
+        errors = []
+        try:
+            reference, baseline = self._setup_baseline(baseline_dir)
+            # Recordings hold the answers of whole questions, only live sessions are scoped to the differing nodes
+            if MODE == "live":
+                self.impact = ChangeImpact.between(
+                    self.answers,
+                    lambda question: self.answers.frame(self.bf_session, self.snapshots.digest, question),
+                    baseline.digest,
+                    changed_files(baseline.files, self.snapshots.files),
+                )
+            if self.impact is not None:
+                scoped = []
+                for question in questions:
+                    if question.name not in NODE_COLUMNS:
+                        scoped.append(question)
+                    elif self.impact.nodes:
+                        params = {**question.params, "nodes": node_specifier(self.impact.nodes)}
+                        scoped.append(question._replace(params=params))
+                    else:
+                        # No node differs from the baseline, nothing was added or removed
+                        self.reports.write(f"{question.report}_diff", pd.DataFrame(columns=["Change"]))
+                questions = scoped
+
+            for result in run_questions(
+                self.bf_session,
+                questions,
+                cache=self.answers,
+                snapshot_hash=f"{self.snapshots.digest}..{baseline.digest}",
+                reference_snapshot=reference,
+            ):
+                self.latencies[result.question.name] = result.latency
+                if result.cached:
+                    self.cached.add(result.question.name)
+                if result.error:
+                    errors.append(result.error)
+                    continue
+                self.reports.write(f"{result.question.report}_diff", findings_changes(result.frame))
+            self.reports.write_index()
+        except Exception as err:
+            errors.append(err)
+
+        if errors:
+            return f"Error Occurred {errors[0]}"
+        return "Successfully Queried Batfish."
+
+
+def findings_changes(frame):
+    """Keep the findings of a differential answer only in the snapshot or only in the reference.
+
+    The Snapshot_ and Reference_ columns of a finding are folded back into the columns of
+    the plain answer, a Change column tells whether the finding was added or removed.
+    A differential answer without a KeyPresence column is returned whole.
+    """
+    if "KeyPresence" not in frame.columns:
+        return frame
+    changes = []
+    for presence, change in CHANGES.items():
+        prefix = "Snapshot_" if change == "added" else "Reference_"
+        rows = frame[frame["KeyPresence"] == presence]
+        columns = {
+            column: column[len(prefix):] if column.startswith(prefix) else column
+            for column in frame.columns
+            if column.startswith(prefix) or not column.startswith(("Snapshot_", "Reference_"))
+        }
+        rows = rows[list(columns)].rename(columns=columns).drop(columns="KeyPresence")
+        changes.append(rows.assign(Change=change))
+    changes = pd.concat(changes, ignore_index=True)
+    return changes[["Change"] + [column for column in changes.columns if column != "Change"]]
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Security cleanup reports of the configurations in ../data.")
+    parser.add_argument(
+        "--baseline", help="Snapshot directory to compare with, only the findings added or removed since are reported"
+    )
+    args = parser.parse_args()
+
     bw = BatfishWebinar("localhost", "security_network", "webinar1")
-    result = bw.execute_bf_questions()
+    print(f"Snapshot {bw.bf_session.snapshot} {bw.snapshots.action}, {bw.snapshots.uploaded} files uploaded.")
+    result = bw.execute_bf_diff(args.baseline) if args.baseline else bw.execute_bf_questions()
+    if bw.impact:
+        print(f"Changed since the previous snapshot: {', '.join(sorted(bw.impact.nodes)) or 'no node'}.")
+    if bw.acl_screen:
+        print(f"{bw.acl_screen.decided} of {bw.acl_screen.lines} ACL lines decided without filterLineReachability.")
+    for question, latency in bw.latencies.items():
+        print(f"{question}: {latency:.2f}s{' (cached)' if question in bw.cached else ''}")
     print("=" * 20)
     print(result)
     print("=" * 20)
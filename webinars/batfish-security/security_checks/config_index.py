@@ -0,0 +1,498 @@
+"""Offline index of the structures each configuration defines and references, answered without Batfish.
+
+A single pass over every file builds a symbol table of the ACLs, object-groups, route-maps,
+prefix-lists and address-books it defines and of the references to them. Structures defined
+but never referenced and references to structures never defined come out in the same
+columns as Batfish's unusedStructures and undefinedReferences, in milliseconds, as a
+pre-check before the snapshot is even uploaded.
+
+This is a command line tool only, batfish_analysis.py still asks Batfish both questions:
+Batfish also tracks structure types the index does not know (NAT rules, crypto maps,
+interfaces), so no answer of the index can stand in for one of Batfish.
+"""
+import argparse
+import glob
+import ipaddress
+import itertools
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from reports import RESULTS_DIR, read_report
+
+CONFIGS_DIR = '../data/configs'
+# Lines read to detect the vendor of a file before indexing it
+DETECT_LINES = 500
+
+# Structure types a reference may point to, when it is not only its own type
+REFERENCE_TARGETS = {
+    "ipv4 acl": ("standard ipv4 access-list", "extended ipv4 access-list"),
+    "object-group protocol or service": ("object-group protocol", "object-group service"),
+    "address-book address or address-set": ("address-book address", "address-book address-set"),
+    "application or application-set": ("application", "application-set"),
+    "address or address-group": ("address", "address-group"),
+    "application or application-group": ("application", "application-group"),
+    "service or service-group": ("service", "service-group"),
+}
+# Names that are built in, never defined in a configuration
+BUILTIN_NAMES = {"any", "any-ipv4", "any-ipv6", "application-default", "service-http", "service-https"}
+
+# IOS numbered ACL ranges
+STANDARD_ACL_NUMBERS = (range(1, 100), range(1300, 2000))
+EXTENDED_ACL_NUMBERS = (range(100, 200), range(2000, 2700))
+# Tokens of an ACL line that take the next token as value
+PORT_OPERATORS = {"eq": 1, "lt": 1, "gt": 1, "neq": 1, "range": 2}
+ADDRESS_KEYWORDS = {"any", "any4", "any6", "host", "object", "object-group", "interface"}
+
+
+class FileIndex:
+    """Structures defined and referenced in one configuration file.
+
+    definitions: {(structure type, name): [lines]}
+    references: {(reference type, name, context): [lines]}
+    """
+
+    def __init__(self, file_name, vendor):
+        """Initializer."""
+        self.file_name = file_name
+        self.vendor = vendor
+        self.definitions = {}
+        self.references = {}
+
+    def define(self, struct_type, name, line):
+        """Record a line defining a structure."""
+        self.definitions.setdefault((struct_type, name), []).append(line)
+
+    def reference(self, struct_type, name, context, line):
+        """Record a line referencing a structure."""
+        if name in BUILTIN_NAMES:
+            return
+        lines = self.references.setdefault((struct_type, name, context), [])
+        if line not in lines:
+            lines.append(line)
+
+
+def detect_vendor(head):
+    """Return the vendor of a configuration from its first lines."""
+    text = "\n".join(head)
+    if re.search(r"(?m)^set (deviceconfig|rulebase|shared|vsys|address|address-group|service) ", text):
+        return "paloalto"
+    if re.search(r"(?m)^set (version|system|interfaces|security|groups|apply-groups) ", text):
+        return "juniper"
+    interfaces = sum(line.startswith("interface ") for line in head)
+    # ASA interfaces carry a nameif, IOS ones rarely do
+    nameifs = sum(" nameif " in line for line in head)
+    if re.search(r"(?m)^ASA Version", text) or (interfaces and nameifs * 2 >= interfaces):
+        return "cisco_asa"
+    return "cisco_ios"
+
+
+def _is_address(token):
+    try:
+        ipaddress.ip_network(token, strict=False)
+        return True
+    except ValueError:
+        return "-" in token and all(_is_address(part) for part in token.split("-", 1))
+
+
+def acl_type(name, kind=None):
+    """Structure type of an IOS/ASA ACL from its name or kind keyword, None when it is not an IPv4 ACL."""
+    if kind in ("standard", "extended"):
+        return f"{kind} ipv4 access-list"
+    if name.isdigit():
+        number = int(name)
+        if any(number in numbers for numbers in STANDARD_ACL_NUMBERS):
+            return "standard ipv4 access-list"
+        if any(number in numbers for numbers in EXTENDED_ACL_NUMBERS):
+            return "extended ipv4 access-list"
+    return None
+
+
+def _acl_address(tokens, position, index, line):
+    """Reference the objects of the address at position of an extended ACL entry, return the next position."""
+    if position >= len(tokens):
+        return position
+    token = tokens[position]
+    if token == "object":
+        index.reference("object network", tokens[position + 1], "extended access-list network object", line)
+        return position + 2
+    if token == "object-group":
+        index.reference(
+            "object-group network", tokens[position + 1], "extended access-list network object-group", line
+        )
+        return position + 2
+    if token in ("host", "interface"):
+        return position + 2
+    if token in ("any", "any4", "any6") or "/" in token:
+        return position + 1
+    # Address and wildcard or mask
+    return position + 2
+
+
+def _acl_ports(tokens, position, index, line, before_address):
+    """Skip or reference the port specification at position of an extended ACL entry, return the next position."""
+    if position >= len(tokens):
+        return position
+    token = tokens[position]
+    if token in PORT_OPERATORS:
+        return position + 1 + PORT_OPERATORS[token]
+    # A service object-group right after the source is only told from the destination by what follows it
+    follows_address = position + 2 < len(tokens) and (
+        tokens[position + 2] in ADDRESS_KEYWORDS or _is_address(tokens[position + 2])
+    )
+    if token == "object-group" and (not before_address or follows_address):
+        index.reference(
+            "object-group service", tokens[position + 1], "extended access-list service object-group", line
+        )
+        return position + 2
+    return position
+
+
+def _index_extended_entry(tokens, index, line):
+    """Reference the objects of an extended ACL entry, tokens start at its action."""
+    position = 1
+    if position < len(tokens) and tokens[position] in ("object", "object-group"):
+        kind = "object service" if tokens[position] == "object" else "object-group protocol or service"
+        context = "extended access-list service object" if kind == "object service" else (
+            "extended access-list protocol or service object-group"
+        )
+        index.reference(kind, tokens[position + 1], context, line)
+        position += 2
+    else:
+        position += 1
+    position = _acl_address(tokens, position, index, line)
+    position = _acl_ports(tokens, position, index, line, before_address=True)
+    position = _acl_address(tokens, position, index, line)
+    _acl_ports(tokens, position, index, line, before_address=False)
+
+
+def _index_cisco(lines, index, asa):
+    block = []
+    for number, text in lines:
+        tokens = text.split()
+        if not tokens or tokens[0] == "!":
+            continue
+        if not text[0].isspace():
+            block = tokens
+        top = block[0] if block else ""
+        command = tokens[0]
+
+        if "inactive" in tokens or "remark" in tokens[:3]:
+            continue
+
+        # Definitions
+        if command == "access-list" and len(tokens) > 2:
+            name = tokens[1]
+            kind = tokens[2] if tokens[2] in ("standard", "extended") else None
+            struct_type = acl_type(name, kind)
+            if struct_type:
+                index.define(struct_type, name, number)
+                if struct_type.startswith("extended"):
+                    _index_extended_entry(tokens[3:] if kind else tokens[2:], index, number)
+            continue
+        if top == "ip" and block[1:2] == ["access-list"] and len(block) > 3:
+            struct_type = acl_type(block[3], block[2])
+            if struct_type:
+                index.define(struct_type, block[3], number)
+                if struct_type.startswith("extended") and text[0].isspace() and tokens[0] in ("permit", "deny"):
+                    _index_extended_entry(tokens, index, number)
+            continue
+        if command == "ip" and tokens[1:2] == ["prefix-list"] and len(tokens) > 2:
+            index.define("ipv4 prefix-list", tokens[2], number)
+            continue
+        if top == "route-map" and len(block) > 1:
+            index.define("route-map", block[1], number)
+        elif top in ("object", "object-group") and len(block) > 2:
+            index.define(f"{top} {block[1]}", block[2], number)
+
+        # References
+        if top == "route-map" and command == "match" and tokens[1:3] == ["ip", "address"]:
+            if tokens[3:4] == ["prefix-list"]:
+                for name in tokens[4:]:
+                    index.reference("ipv4 prefix-list", name, "route-map match ipv4 prefix-list", number)
+            else:
+                for name in tokens[3:]:
+                    index.reference("ipv4 acl", name, "route-map match ipv4 access-list", number)
+        # Interface commands, also found unindented after their interface in hand-edited files
+        elif command == "ip" and tokens[1:2] == ["access-group"] and len(tokens) > 3:
+            direction = "incoming" if tokens[3] == "in" else "outgoing"
+            index.reference("ipv4 acl", tokens[2], f"interface {direction} filter", number)
+        elif tokens[:3] == ["ip", "policy", "route-map"] and len(tokens) > 3:
+            index.reference("route-map", tokens[3], "interface ip policy route-map", number)
+        elif top == "line" and command == "access-class" and len(tokens) > 1:
+            index.reference("ipv4 acl", tokens[1], "line access-class", number)
+        elif top == "crypto" and tokens[:2] == ["match", "address"] and len(tokens) > 2:
+            index.reference("ipv4 acl", tokens[2], "crypto map match address", number)
+        elif top == "object-group" and command in ("network-object", "group-object", "service-object"):
+            if command == "group-object":
+                index.reference(f"object-group {block[1]}", tokens[1], f"object-group {block[1]} group-object", number)
+            elif tokens[1:2] == ["object"] and len(tokens) > 2:
+                kind = "network" if command == "network-object" else "service"
+                index.reference(f"object {kind}", tokens[2], f"object-group {kind} {command} object", number)
+        elif command == "ip" and tokens[1:2] == ["nat"] and "source" in tokens:
+            if "list" in tokens:
+                name = tokens[tokens.index("list") + 1]
+                index.reference("ipv4 acl", name, "ip nat source dynamic access-list", number)
+            if "route-map" in tokens:
+                name = tokens[tokens.index("route-map") + 1]
+                index.reference("route-map", name, "ip nat source route-map", number)
+        elif command == "neighbor" and len(tokens) > 4 and tokens[2] in ("route-map", "prefix-list"):
+            direction = "inbound" if tokens[4] == "in" else "outbound"
+            if tokens[2] == "route-map":
+                index.reference("route-map", tokens[3], f"bgp {direction} route-map", number)
+            else:
+                index.reference("ipv4 prefix-list", tokens[3], f"bgp {direction} prefix-list", number)
+        elif command == "redistribute" and "route-map" in tokens[:-1]:
+            index.reference("route-map", tokens[tokens.index("route-map") + 1], "redistribute route-map", number)
+        elif command == "distribute-list" and len(tokens) > 2:
+            if tokens[1] == "prefix":
+                index.reference("ipv4 prefix-list", tokens[2], "distribute-list prefix-list", number)
+            else:
+                index.reference("ipv4 acl", tokens[1], "distribute-list access-list", number)
+        elif asa and command == "access-group" and len(tokens) > 2:
+            index.reference("ipv4 acl", tokens[1], "access-group", number)
+        elif asa and top == "class-map" and tokens[:2] == ["match", "access-list"] and len(tokens) > 2:
+            index.reference("ipv4 acl", tokens[2], "class-map match access-list", number)
+
+
+def _index_juniper(lines, index):
+    for number, text in lines:
+        tokens = text.replace('"', "").split()
+        if tokens[:1] != ["set"]:
+            continue
+        # Statements of a configuration group apply wherever the group is applied
+        if tokens[1:2] == ["groups"]:
+            tokens = tokens[:1] + tokens[3:]
+        if "address-book" in tokens:
+            book = tokens[tokens.index("address-book") + 1:]
+            if book[:1] == ["global"]:
+                book = book[1:]
+            if len(book) < 2:
+                continue
+            if book[0] == "address":
+                index.define("address-book address", book[1], number)
+            elif book[0] == "address-set":
+                index.define("address-book address-set", book[1], number)
+                if book[2:3] == ["address"] and len(book) > 3:
+                    index.reference("address-book address", book[3], "address-set address", number)
+                elif book[2:3] == ["address-set"] and len(book) > 3:
+                    index.reference("address-book address-set", book[3], "address-set address-set", number)
+        elif tokens[1:3] == ["security", "policies"] and "match" in tokens:
+            match = tokens[tokens.index("match") + 1:]
+            if len(match) < 2:
+                continue
+            if match[0] in ("source-address", "destination-address"):
+                context = f"security policy match {match[0]}"
+                index.reference("address-book address or address-set", match[1], context, number)
+            elif match[0] == "application" and not match[1].startswith("junos-"):
+                index.reference("application or application-set", match[1], "security policy match application", number)
+        elif tokens[1:2] == ["firewall"] and "filter" in tokens:
+            name = tokens[tokens.index("filter") + 1]
+            index.define("firewall filter", name, number)
+            for keyword in ("prefix-list", "source-prefix-list", "destination-prefix-list"):
+                if keyword in tokens[:-1]:
+                    name = tokens[tokens.index(keyword) + 1]
+                    index.reference("prefix-list", name, f"firewall filter {keyword}", number)
+        elif tokens[1:3] == ["policy-options", "policy-statement"] and len(tokens) > 3:
+            index.define("policy-statement", tokens[3], number)
+            for keyword in ("prefix-list", "prefix-list-filter"):
+                if keyword in tokens[:-1]:
+                    name = tokens[tokens.index(keyword) + 1]
+                    index.reference("prefix-list", name, f"policy-statement {keyword}", number)
+            if "policy" in tokens[4:-1]:
+                name = tokens[tokens.index("policy", 4) + 1]
+                index.reference("policy-statement", name, "policy-statement policy", number)
+        elif tokens[1:3] == ["policy-options", "prefix-list"] and len(tokens) > 3:
+            index.define("prefix-list", tokens[3], number)
+        elif tokens[1:3] == ["applications", "application"] and len(tokens) > 3:
+            index.define("application", tokens[3], number)
+        elif tokens[1:3] == ["applications", "application-set"] and len(tokens) > 3:
+            index.define("application-set", tokens[3], number)
+            if tokens[4:5] == ["application"] and len(tokens) > 5 and not tokens[5].startswith("junos-"):
+                index.reference("application or application-set", tokens[5], "application-set application", number)
+        elif tokens[1:2] == ["interfaces"] and "filter" in tokens and len(tokens) > tokens.index("filter") + 2:
+            position = tokens.index("filter")
+            direction = "incoming" if tokens[position + 1] == "input" else "outgoing"
+            index.reference("firewall filter", tokens[position + 2], f"interface {direction} filter", number)
+        elif tokens[1:2] in (["protocols"], ["routing-options"]) and tokens[-2:-1] in (["import"], ["export"]):
+            index.reference("policy-statement", tokens[-1], f"{tokens[-2]} policy", number)
+
+
+def _members(tokens):
+    """Values of a PAN-OS statement, either one value or a [ bracketed list ]."""
+    if tokens[:1] == ["["]:
+        return [token for token in tokens[1:] if token != "]"]
+    return tokens[:1]
+
+
+def _index_paloalto(lines, index):
+    for number, text in lines:
+        tokens = text.replace('"', "").split()
+        if tokens[:1] != ["set"]:
+            continue
+        # Objects of the shared scope or of a vsys are indexed like the default vsys ones
+        if tokens[1:2] == ["shared"]:
+            tokens = tokens[:1] + tokens[2:]
+        elif tokens[1:2] == ["vsys"]:
+            tokens = tokens[:1] + tokens[3:]
+        if len(tokens) < 3:
+            continue
+
+        if tokens[1] in ("address", "address-group", "service", "service-group", "application-group"):
+            index.define(tokens[1], tokens[2], number)
+            if tokens[1] == "address-group" and tokens[3:4] == ["static"]:
+                for name in _members(tokens[4:]):
+                    index.reference("address or address-group", name, "address-group static", number)
+            elif tokens[1] == "service-group" and tokens[3:4] == ["members"]:
+                for name in _members(tokens[4:]):
+                    index.reference("service or service-group", name, "service-group members", number)
+        elif tokens[1] == "application":
+            index.define("application", tokens[2], number)
+        elif tokens[1] == "rulebase" and tokens[3:4] == ["rules"] and len(tokens) > 6:
+            field, values = tokens[5], _members(tokens[6:])
+            if field in ("source", "destination"):
+                for name in values:
+                    if not _is_address(name):
+                        index.reference("address or address-group", name, f"{tokens[2]} rule {field}", number)
+            elif field == "service":
+                for name in values:
+                    index.reference("service or service-group", name, f"{tokens[2]} rule service", number)
+            elif field == "application":
+                for name in values:
+                    index.reference("application or application-group", name, f"{tokens[2]} rule application", number)
+
+
+INDEXERS = {
+    "cisco_ios": lambda lines, index: _index_cisco(lines, index, asa=False),
+    "cisco_asa": lambda lines, index: _index_cisco(lines, index, asa=True),
+    "juniper": _index_juniper,
+    "paloalto": _index_paloalto,
+}
+
+
+def index_file(path):
+    """Index the definitions and references of a configuration file in one pass."""
+    file_name = f"configs/{os.path.basename(path)}"
+    with open(path, errors="replace") as file:
+        lines = enumerate((line.rstrip("\n") for line in file), start=1)
+        head = list(itertools.islice(lines, DETECT_LINES))
+        index = FileIndex(file_name, detect_vendor([text for _, text in head]))
+        INDEXERS[index.vendor](itertools.chain(head, lines), index)
+    return index
+
+
+def index_configs(configs_dir=CONFIGS_DIR, processes=None):
+    """Index every configuration of a directory, one file per process."""
+    paths = sorted(glob.glob(os.path.join(configs_dir, "*")))
+    # Not worth starting processes for a single file
+    if processes == 1 or len(paths) < 2:
+        return list(map(index_file, paths))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(index_file, paths))
+
+
+def _lines(file_name, lines):
+    return f"{file_name}:{sorted(set(lines))}"
+
+
+def _referenced(index):
+    """Set of (structure type, name) referenced in a file."""
+    referenced = set()
+    for struct_type, name, _ in index.references:
+        for target in REFERENCE_TARGETS.get(struct_type, (struct_type,)):
+            referenced.add((target, name))
+    return referenced
+
+
+def unused_structures(indexes):
+    """Structures defined but never referenced, in the columns of Batfish's unusedStructures."""
+    rows = []
+    for index in indexes:
+        referenced = _referenced(index)
+        for (struct_type, name), lines in sorted(index.definitions.items()):
+            if (struct_type, name) not in referenced:
+                rows.append([index.file_name, struct_type, name, _lines(index.file_name, lines)])
+    return pd.DataFrame(rows, columns=["File_Name", "Structure_Type", "Structure_Name", "Source_Lines"])
+
+
+def undefined_references(indexes):
+    """References to structures never defined, in the columns of Batfish's undefinedReferences."""
+    rows = []
+    for index in indexes:
+        for (struct_type, name, context), lines in sorted(index.references.items()):
+            targets = REFERENCE_TARGETS.get(struct_type, (struct_type,))
+            if not any((target, name) in index.definitions for target in targets):
+                rows.append([index.file_name, struct_type, name, context, _lines(index.file_name, lines)])
+    return pd.DataFrame(rows, columns=["File_Name", "Struct_Type", "Ref_Name", "Context", "Lines"])
+
+
+def compare(frame, report, columns, type_column, results_dir=RESULTS_DIR):
+    """Compare findings with a report written from Batfish's answer.
+
+    Return the findings both have, the ones only Batfish has for a structure type the
+    index knows, the ones only Batfish has for other types and the ones only the index has.
+    """
+    batfish = read_report(report, results_dir)
+    expected = set(batfish[columns].itertuples(index=False, name=None))
+    found = set(frame[columns].itertuples(index=False, name=None))
+    position = columns.index(type_column)
+    known = set(frame[type_column]) | {
+        target for targets in REFERENCE_TARGETS.values() for target in targets
+    } | set(REFERENCE_TARGETS)
+    missing = expected - found
+    return {
+        "matched": expected & found,
+        "missing": {row for row in missing if row[position] in known},
+        "not indexed": {row for row in missing if row[position] not in known},
+        "extra": found - expected,
+    }
+
+
+def main():
+    """Index the configurations and print the findings, optionally checked against the Batfish reports."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--configs", default=CONFIGS_DIR, help="Directory of the configurations")
+    parser.add_argument("--processes", type=int, default=None, help="Number of index processes (default: CPU count)")
+    parser.add_argument(
+        "--validate", action="store_true", help="Compare the findings with the reports in ../batfish_results"
+    )
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    indexes = index_configs(args.configs, args.processes)
+    unused = unused_structures(indexes)
+    undefined = undefined_references(indexes)
+    elapsed = time.monotonic() - start
+
+    with pd.option_context("display.max_rows", None, "display.width", 200, "display.max_colwidth", 80):
+        print(unused.to_string())
+        print(undefined.to_string())
+    for index in indexes:
+        definitions, references = len(index.definitions), len(index.references)
+        print(f"{index.file_name}: {index.vendor}, {definitions} definitions, {references} references")
+    print(f"{len(unused)} unused structures, {len(undefined)} undefined references in {elapsed * 1000:.0f}ms.")
+
+    if args.validate:
+        checks = [
+            (unused, "unused_structures", ["Structure_Type", "Structure_Name", "Source_Lines"], "Structure_Type"),
+            (
+                undefined,
+                "undefined_references",
+                ["File_Name", "Struct_Type", "Ref_Name", "Context", "Lines"],
+                "Struct_Type",
+            ),
+        ]
+        for frame, report, columns, type_column in checks:
+            result = compare(frame, report, columns, type_column)
+            print("=" * 20)
+            print(f"{report}: " + ", ".join(f"{len(rows)} {name}" for name, rows in result.items()))
+            for name in ("missing", "not indexed", "extra"):
+                for row in sorted(result[name]):
+                    print(f"  {name}: {row}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Ask several Batfish questions at the same time against one snapshot."""
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# A question of the session (`bf.q.<name>(**params)`) and the name of the report its answer is saved to
+Question = namedtuple("Question", ["name", "report", "params"], defaults=[{}])
+# Answer of a question, frame is None and error is set when the question failed
+QuestionResult = namedtuple("QuestionResult", ["question", "frame", "latency", "error", "cached"])
+
+
+def run_questions(
+    session, questions, max_workers=None, cache=None, snapshot_hash=None, impact=None, reference_snapshot=None
+):
+    """Yield a QuestionResult per question as soon as its answer is in.
+
+    All questions are submitted at once, so the total runtime is the one of the slowest
+    question. The snapshot is pinned when the questions are submitted, changing the
+    snapshot of the session while they run has no effect on the answers. With an
+    AnswerCache and the hash of the snapshot content, answers already known for this
+    content are read from the cache instead of asking Batfish. With a ChangeImpact as
+    well, the answers of the previous snapshot are reused for the nodes the change does
+    not affect, and Batfish is only asked about the others. With a reference snapshot,
+    questions are answered differentially against it, and snapshot_hash has to cover
+    the content of both snapshots.
+    """
+    snapshot = session.snapshot
+
+    # Questions are built upfront, only the blocking answer() calls run in the pool
+    asked = [(question, getattr(session.q, question.name)(**question.params)) for question in questions]
+
+    def answer(question, bf_question):
+        start = time.monotonic()
+        try:
+            if cache is not None:
+                key = cache.key(snapshot_hash, question.name, question.params)
+                frame = cache.get(key)
+                if frame is not None:
+                    return frame, time.monotonic() - start, None, True
+
+            frame = None
+            if cache is not None and impact is not None:
+                frame = impact.answer(
+                    cache,
+                    question.name,
+                    question.params,
+                    lambda params: getattr(session.q, question.name)(**params).answer(snapshot=snapshot).frame(),
+                )
+            if frame is None:
+                frame = bf_question.answer(snapshot=snapshot, reference_snapshot=reference_snapshot).frame()
+            if cache is not None:
+                cache.put(key, frame)
+            return frame, time.monotonic() - start, None, False
+        except Exception as err:
+            return None, time.monotonic() - start, err, False
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(asked) or 1) as executor:
+        futures = {executor.submit(answer, *question): question[0] for question in asked}
+        for future in as_completed(futures):
+            yield QuestionResult(futures[future], *future.result())
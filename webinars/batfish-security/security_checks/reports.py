@@ -0,0 +1,163 @@
+"""Write Batfish answers as paginated HTML and Parquet files, with an index page linking them."""
+import glob
+import html
+import os
+import time
+from datetime import date, datetime
+from html.parser import HTMLParser
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+RESULTS_DIR = '../batfish_results'
+# Rows per HTML page, a page stays small enough for a browser to open
+PAGE_SIZE = 1000
+# Rows converted and written to Parquet at a time
+PARQUET_CHUNK_SIZE = 50000
+
+
+def _page_name(report, page):
+    """File name of a page of a report, the first page keeps the plain report name."""
+    return f"{report}.html" if page == 1 else f"{report}-{page}.html"
+
+
+class _TableParser(HTMLParser):
+    """Collect the header and rows of the tables of a report page."""
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self.cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self.rows.append([])
+        elif tag in ("td", "th"):
+            self.cell = ""
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self.cell is not None:
+            self.rows[-1].append(self.cell.strip())
+            self.cell = None
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell += data
+
+
+def read_report(report, results_dir=RESULTS_DIR):
+    """Read every page of a report back as a DataFrame of strings, without an HTML parsing dependency."""
+    header, rows = None, []
+    page = 1
+    while os.path.exists(os.path.join(results_dir, _page_name(report, page))):
+        parser = _TableParser()
+        with open(os.path.join(results_dir, _page_name(report, page))) as file:
+            parser.feed(file.read())
+        # The first column of a page is the index written by to_html
+        header, *page_rows = [row[1:] for row in parser.rows if row]
+        rows.extend(page_rows)
+        page += 1
+    return pd.DataFrame(rows, columns=header)
+
+
+def _to_arrow(chunk, schema=None):
+    """Convert a chunk of an answer to an Arrow table, Batfish objects (interfaces, lists, ...) become strings."""
+    chunk = chunk.copy()
+    for column in chunk.columns:
+        if chunk[column].dtype == object:
+            chunk[column] = chunk[column].map(lambda value: None if value is None else str(value))
+    return pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+
+class ReportWriter:
+    """Write every answer of a run to the results directory, one chunk of rows at a time.
+
+    Each answer is written as HTML pages of PAGE_SIZE rows linked to each other and, when
+    pyarrow is installed, as one Parquet file for downstream tooling. `write_index()`
+    writes an index.html linking every report with its row count and generation time.
+    """
+
+    def __init__(self, results_dir=RESULTS_DIR, page_size=PAGE_SIZE):
+        """Initializer."""
+        self.results_dir = results_dir
+        self.page_size = page_size
+        self.reports = []
+
+    def write(self, report, answer_df):
+        """Write an answer as `<report>.html` (and following pages) and `<report>.parquet`."""
+        start = time.monotonic()
+        os.makedirs(self.results_dir, exist_ok=True)
+        rows = len(answer_df)
+        pages = max(1, -(-rows // self.page_size))
+
+        # Drop the pages of a previous, longer, answer
+        for path in glob.glob(os.path.join(self.results_dir, f"{glob.escape(report)}-*.html")):
+            os.remove(path)
+
+        for page in range(1, pages + 1):
+            first = (page - 1) * self.page_size
+            self._write_page(report, page, pages, rows, answer_df.iloc[first : first + self.page_size])
+
+        parquet = self._write_parquet(report, answer_df) if pq else None
+        self.reports.append(
+            {
+                "report": report,
+                "rows": rows,
+                "pages": pages,
+                "parquet": parquet,
+                "generated": datetime.now().replace(microsecond=0),
+                "duration": time.monotonic() - start,
+            }
+        )
+
+    def _write_page(self, report, page, pages, rows, chunk):
+        links = ['<a href="index.html">Index</a>']
+        if page > 1:
+            links.append(f'<a href="{_page_name(report, page - 1)}">Previous</a>')
+        if page < pages:
+            links.append(f'<a href="{_page_name(report, page + 1)}">Next</a>')
+        first = (page - 1) * self.page_size
+
+        with open(os.path.join(self.results_dir, _page_name(report, page)), "w") as file:
+            file.write(f"<h1>Today's date: {date.today()}</h1>")
+            file.write(f"<h2>{html.escape(report)}</h2>")
+            file.write(f"<p>Rows {min(first + 1, rows)} to {first + len(chunk)} of {rows}, page {page} of {pages}</p>")
+            file.write(f"<p>{' | '.join(links)}</p>")
+            chunk.to_html(file)
+
+    def _write_parquet(self, report, answer_df):
+        filename = f"{report}.parquet"
+        writer = None
+        try:
+            for first in range(0, len(answer_df), PARQUET_CHUNK_SIZE):
+                table = _to_arrow(answer_df.iloc[first : first + PARQUET_CHUNK_SIZE], writer and writer.schema)
+                if writer is None:
+                    writer = pq.ParquetWriter(os.path.join(self.results_dir, filename), table.schema)
+                writer.write_table(table)
+            if writer is None:
+                pq.write_table(_to_arrow(answer_df), os.path.join(self.results_dir, filename))
+        finally:
+            if writer is not None:
+                writer.close()
+        return filename
+
+    def write_index(self):
+        """Write index.html linking every report written so far."""
+        with open(os.path.join(self.results_dir, "index.html"), "w") as file:
+            file.write(f"<h1>Today's date: {date.today()}</h1>")
+            file.write("<table border=\"1\"><tr><th>Report</th><th>Rows</th><th>Pages</th><th>Parquet</th>")
+            file.write("<th>Generated</th><th>Write time</th></tr>")
+            for entry in sorted(self.reports, key=lambda entry: entry["report"]):
+                report = html.escape(entry["report"])
+                parquet = f'<a href="{report}.parquet">{report}.parquet</a>' if entry["parquet"] else "-"
+                file.write(
+                    f'<tr><td><a href="{report}.html">{report}</a></td><td>{entry["rows"]}</td>'
+                    f'<td>{entry["pages"]}</td><td>{parquet}</td><td>{entry["generated"]}</td>'
+                    f'<td>{entry["duration"]:.2f}s</td></tr>'
+                )
+            file.write("</table>")
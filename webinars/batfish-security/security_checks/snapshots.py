@@ -0,0 +1,102 @@
+"""Reuse Batfish snapshots across runs based on the content of the snapshot directory."""
+import json
+import os
+import shutil
+import tempfile
+
+from batfish_common.answer_cache import hash_directory, hash_files
+
+# Hashes of the last snapshot uploaded per network, kept outside of the snapshot directory
+MANIFEST_FILE = '../.snapshot_manifest.json'
+# Largest share of changed files for which the previous snapshot is forked instead of uploading everything
+FORK_RATIO = 0.25
+
+
+class SnapshotManager:
+    """Upload a snapshot directory to Batfish only when, and only as much as, it changed.
+
+    Snapshots are named after the hash of their content. When a snapshot with the same
+    content already exists it is reused as is. When only a few files changed since the
+    previous run, the previous snapshot is forked with just those files, otherwise the
+    whole directory is uploaded. The previous snapshot is deleted once replaced.
+    """
+
+    def __init__(self, session, snapshot_dir, manifest_file=MANIFEST_FILE):
+        """Initializer."""
+        self.session = session
+        self.snapshot_dir = snapshot_dir
+        self.manifest_file = manifest_file
+        self.digest = None
+        self.files = {}
+        # Manifest entry of the snapshot used before this one: its name, digest and files
+        self.previous = {}
+        self.action = None
+        self.uploaded = 0
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_file) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        with open(self.manifest_file, "w") as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+
+    def setup(self, name):
+        """Make the current content of the snapshot directory the active snapshot, return its name."""
+        hashes = self.files = hash_files(self.snapshot_dir)
+        self.digest = hash_directory(self.snapshot_dir, hashes)
+        snapshot = f"{name}-{self.digest[:12]}"
+
+        manifest = self._load_manifest()
+        previous = self.previous = manifest.get(self.session.network, {})
+        existing = self.session.list_snapshots()
+
+        if snapshot in existing:
+            self.action, self.uploaded = "reused", 0
+        else:
+            previous_files = previous.get("files", {})
+            changed = [path for path, digest in hashes.items() if previous_files.get(path) != digest]
+            # A fork can add or replace files but not remove them
+            removed = set(previous_files) - set(hashes)
+
+            if previous.get("snapshot") in existing and not removed and len(changed) <= FORK_RATIO * len(hashes):
+                self._fork(previous["snapshot"], snapshot, changed)
+                self.action, self.uploaded = "forked", len(changed)
+            else:
+                self.session.init_snapshot(self.snapshot_dir, name=snapshot, overwrite=True)
+                self.action, self.uploaded = "initialized", len(hashes)
+
+            if previous.get("snapshot") in existing:
+                self.session.delete_snapshot(previous["snapshot"])
+
+        self.session.set_snapshot(snapshot)
+        manifest[self.session.network] = {"snapshot": snapshot, "digest": self.digest, "files": hashes}
+        self._save_manifest(manifest)
+        return snapshot
+
+    def replay(self, name):
+        """Make the snapshot named after the current content active without uploading it, return its name.
+
+        For a session replaying recorded answers, there is no Batfish service to upload to.
+        """
+        self.files = hash_files(self.snapshot_dir)
+        self.digest = hash_directory(self.snapshot_dir, self.files)
+        snapshot = f"{name}-{self.digest[:12]}"
+        self.action, self.uploaded = "replayed", 0
+        self.session.set_snapshot(snapshot)
+        return snapshot
+
+    def _fork(self, base_snapshot, snapshot, changed):
+        """Fork the base snapshot, replacing or adding the changed files."""
+        add_files = tempfile.mkdtemp()
+        try:
+            for path in changed:
+                target = os.path.join(add_files, path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(os.path.join(self.snapshot_dir, path), target)
+            self.session.fork_snapshot(base_snapshot, name=snapshot, overwrite=True, add_files=add_files)
+        finally:
+            shutil.rmtree(add_files, ignore_errors=True)
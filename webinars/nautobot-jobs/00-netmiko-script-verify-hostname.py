@@ -1,9 +1,10 @@
 """Gathers devices from nautobot, filtered by site and validates hostname pattern."""
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 from netmiko import ConnectHandler
-from netmiko.exceptions import NetmikoTimeoutException, NetmikoAuthenticationException
+from netmiko.exceptions import NetmikoTimeoutException, NetmikoAuthenticationException, ReadTimeout
 import pynautobot
 from rich import print as rich_print
 from rich.table import Table
@@ -20,74 +21,91 @@ COMMAND_MAP = {
     "arista_eos": "show run | include hostname",
     "juniper_junos": "show configuration system host-name",
 }
-
-
-def verify_hostnames(devices):
-    """Connect to devices, verify hostname pattern & matching Nautobot."""
+# Number of devices checked in parallel
+MAX_WORKERS = int(os.getenv("NETMIKO_WORKERS", "20"))
+# Hard cap on concurrent SSH sessions, whatever the worker count
+MAX_CONNECTIONS = int(os.getenv("NETMIKO_MAX_CONNECTIONS", "50"))
+# Seconds a single device may wait on each step of its session before it is reported as failed
+DEVICE_DEADLINE = float(os.getenv("NETMIKO_DEVICE_DEADLINE", "30"))
+
+
+def check_device(device, deadline=DEVICE_DEADLINE):
+    """Connect to a single device and return its (hostname, status, reason) row."""
+    # Validate the Device has a primary IP set
+    if not device.primary_ip:
+        return device.name, FAILED_STATUS, "Missing Primary IP"
+
+    # Validate the Device Platform is set and is supported by the script
+    if not device.platform or not device.platform.slug in COMMAND_MAP:
+        return (
+            device.name,
+            FAILED_STATUS,
+            "Check Platform slug supported device_types.",
+        )
+
+    # Make sure to be able to gracefully catch an exception and log a failure
+    try:
+        # Build connection to Device, every step of the session times out on its own
+        # so a hung device never holds a worker past its deadline
+        with ConnectHandler(
+            device_type=device.platform.slug,
+            host=device.primary_ip.address.split("/")[0],
+            username=os.getenv("NETMIKO_USER"),
+            password=os.getenv("NETMIKO_PASS"),
+            conn_timeout=2,
+            auth_timeout=deadline,
+            banner_timeout=deadline,
+            read_timeout_override=deadline,
+        ) as conn:
+
+            # Send a Platform specific command to get configured hostname
+            hostname = conn.send_command(COMMAND_MAP[device.platform.slug])
+
+            # Remove any unneeded extra data from the return
+            hostname = re.sub(r"(host\-name|hostname|\s|\;|\n)", "", hostname)
+
+            # Check if the hostname matches the expected pattern
+            if HOSTNAME_PATTERN.match(hostname):
+                return device.name, SUCCESS_STATUS, ""
+
+            # Mark the Device as failed in the job results
+            return device.name, FAILED_STATUS, "Does Not Match Hostname Pattern."
+
+    # Catch Authentication issue and log the failure
+    except NetmikoAuthenticationException:
+        return device.name, FAILED_STATUS, "Authentication error."
+
+    # Catch timeout issue and log the failure
+    except NetmikoTimeoutException:
+        return device.name, FAILED_STATUS, "Timeout error."
+
+    # Catch a command still running after the deadline and log the failure
+    except ReadTimeout:
+        return device.name, FAILED_STATUS, "Deadline exceeded."
+
+    # Catch unaccounted issue and log the failure
+    except:
+        return device.name, FAILED_STATUS, "Unknown error."
+
+
+def verify_hostnames(devices, workers=MAX_WORKERS, deadline=DEVICE_DEADLINE):
+    """Connect to devices in parallel, verify hostname pattern & matching Nautobot.
+
+    Up to `workers` devices are checked at once (never more than MAX_CONNECTIONS),
+    and a device waiting more than `deadline` seconds on any step of its session is
+    reported as failed. Rows are added in the same order as `devices`, whatever order
+    checks finish in.
+    """
     # Start a results Table object
     results_table = Table(title="Hostname Validation")
     results_table.add_column("Hostname", no_wrap=True)
     results_table.add_column("Status")
     results_table.add_column("Reason", no_wrap=True, justify="right")
 
-    # Iterate through each Device object, limited to just the site of NYC.
-    for device in devices:
-
-        # Validate the Device has a primary IP set
-        if not device.primary_ip:
-            results_table.add_row(device.name, FAILED_STATUS, "Missing Primary IP")
-            # Skip to next iteration of the list
-            continue
-
-        # Validate the Device Platform is set and is supported by the script
-        if not device.platform or not device.platform.slug in COMMAND_MAP:
-            results_table.add_row(
-                device.name,
-                FAILED_STATUS,
-                "Check Platform slug supported device_types.",
-            )
-            # Skip to next iteration of the list
-            continue
-
-        # Make sure to be able to gracefully catch an exception and log a failure
-        try:
-            # Build connection to Device
-            with ConnectHandler(
-                device_type=device.platform.slug,
-                host=device.primary_ip.address.split("/")[0],
-                username=os.getenv("NETMIKO_USER"),
-                password=os.getenv("NETMIKO_PASS"),
-                conn_timeout=2,
-            ) as conn:
-
-                # Send a Platform specific command to get configured hostname
-                hostname = conn.send_command(COMMAND_MAP[device.platform.slug])
-
-                # Remove any unneeded extra data from the return
-                hostname = re.sub(r"(host\-name|hostname|\s|\;|\n)", "", hostname)
-
-                # Check if the hostname matches the expected pattern
-                if HOSTNAME_PATTERN.match(hostname):
-                    results_table.add_row(device.name, SUCCESS_STATUS, "")
-                    # Skip to next iteration of the list
-                    continue
-
-                # Mark the Device as failed in the job results
-                results_table.add_row(
-                    device.name, FAILED_STATUS, "Does Not Match Hostname Pattern."
-                )
-
-        # Catch Authentication issue and log the failure
-        except NetmikoAuthenticationException:
-            results_table.add_row(device.name, FAILED_STATUS, "Authentication error.")
-
-        # Catch timeout issue and log the failure
-        except NetmikoTimeoutException:
-            results_table.add_row(device.name, FAILED_STATUS, "Timeout error.")
-
-        # Catch unaccounted issue and log the failure
-        except:
-            results_table.add_row(device.name, FAILED_STATUS, "Unknown error.")
+    # The pool is the connection cap, map returns the rows in the order of the devices
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, MAX_CONNECTIONS))) as pool:
+        for row in pool.map(lambda device: check_device(device, deadline), devices):
+            results_table.add_row(*row)
 
     # Return the table that was built
     return results_table
@@ -1,12 +1,20 @@
 """Nautobot job to verify hostname matches pattern."""
+import os
 import re
+import sys
 
 from django.conf import settings
 from nautobot.dcim.models import Device
 from nautobot.extras.jobs import Job
-from netmiko import ConnectHandler
 from netmiko.exceptions import NetmikoTimeoutException, NetmikoAuthenticationException
 
+# Nautobot loads job modules by file path, make the helper modules next to this file importable
+if os.path.dirname(__file__) not in sys.path:
+    sys.path.append(os.path.dirname(__file__))
+
+from connection_pool import get_pool
+from device_inventory import load_inventory
+
 
 # Expected hostname regex pattern
 HOSTNAME_PATTERN = re.compile(r"[a-z0-1]+\-[a-z]+\-\d+\.infra\.ntc\.com")
@@ -31,32 +39,32 @@ class VerifyHostnameNoInput(Job):
     def run(self, data, commit):
         """Run method for executing the checks on the devices."""
         # Iterate through each Device object, limited to just the site of NYC.
-        for device in Device.objects.filter(site__slug="nyc"):
+        for device, host, platform in load_inventory(Device.objects.filter(site__slug="nyc")):
 
             # Validate the Device has a primary IP set
-            if not device.primary_ip:
+            if not host:
                 self.log_failure(device, "Missing Primary IP")
                 # Skip to next iteration of the list
                 continue
 
             # Validate the Device Platform is set and is supported by the script
-            if not device.platform or not device.platform.slug in COMMAND_MAP:
+            if not platform in COMMAND_MAP:
                 self.log_failure(device, "Check Platform slug supported device_types.")
                 # Skip to next iteration of the list
                 continue
 
             # Make sure to be able to gracefully catch an exception and log a failure
             try:
-                # Build connection to Device
-                with ConnectHandler(
-                    device_type=device.platform.slug,
-                    host=str(device.primary_ip.address.ip),
+                # Build connection to Device, reusing an open session when there is one
+                with get_pool().connection(
+                    device_type=platform,
+                    host=host,
                     username=settings.NAPALM_USERNAME,
                     password=settings.NAPALM_PASSWORD,
                 ) as conn:
 
                     # Send a Platform specific command to get configured hostname
-                    hostname = conn.send_command(COMMAND_MAP[device.platform.slug])
+                    hostname = conn.send_command(COMMAND_MAP[platform])
 
                     # Remove any unneeded extra data from the return
                     hostname = re.sub(r"(host\-name|hostname|\s|\;|\n)", "", hostname)
@@ -81,3 +89,6 @@ class VerifyHostnameNoInput(Job):
             # Catch unaccounted issue and log the failure
             except:
                 self.log_failure(device, "Unknown error.")
+
+        # Report how many SSH sessions were reused from previous runs
+        get_pool().log_stats(self)
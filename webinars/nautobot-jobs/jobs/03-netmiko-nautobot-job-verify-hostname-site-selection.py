@@ -1,11 +1,27 @@
 """Nautobot job to verify hostname matches pattern."""
+import asyncio
+import os
 import re
+import sys
+import time
 
 from django.conf import settings
-from nautobot.dcim.models import Device, Site
-from nautobot.extras.jobs import Job, ObjectVar
-from netmiko import ConnectHandler
+from django.db.models import Q
+from nautobot.dcim.models import Device, Region, Site
+from nautobot.extras.jobs import BooleanVar, IntegerVar, Job, MultiObjectVar, ObjectVar, StringVar
+from nautobot.extras.models import DynamicGroup
 from netmiko.exceptions import NetmikoTimeoutException, NetmikoAuthenticationException
+from scrapli import AsyncScrapli
+from scrapli.exceptions import ScrapliAuthenticationFailed, ScrapliTimeout
+
+# Nautobot loads job modules by file path, make the helper modules next to this file importable
+if os.path.dirname(__file__) not in sys.path:
+    sys.path.append(os.path.dirname(__file__))
+
+from connection_pool import get_pool
+from device_inventory import load_inventory
+from job_log_buffer import BATCH_SIZE, JobLogBuffer
+from job_shards import ShardReport, enqueue_shards, split
 
 
 # Expected hostname regex pattern
@@ -17,14 +33,118 @@ COMMAND_MAP = {
     "arista_eos": "show run | include hostname",
     "juniper_junos": "show configuration system host-name",
 }
+# Scrapli platform running the same COMMAND_MAP command for each platform slug
+SCRAPLI_PLATFORM_MAP = {
+    "cisco_ios": "cisco_iosxe",
+    "cisco_nxos": "cisco_nxos",
+    "arista_eos": "arista_eos",
+    "juniper_junos": "juniper_junos",
+}
+# Maximum number of devices checked at the same time in concurrent mode
+MAX_CONCURRENCY = 100
+# Log entries written per batch by the shards, so results show up while a shard is running
+STREAM_BATCH_SIZE = 10
+# Maximum number of job workers a multi-site check is split across
+MAX_SHARDS = 16
+
+
+async def fetch_hostname(host, platform, semaphore):
+    """Open an async SSH session to a device and return the output of its hostname command."""
+    async with semaphore:
+        async with AsyncScrapli(
+            host=host,
+            auth_username=settings.NAPALM_USERNAME,
+            auth_password=settings.NAPALM_PASSWORD,
+            auth_strict_key=False,
+            platform=SCRAPLI_PLATFORM_MAP[platform],
+            transport="asyncssh",
+            timeout_socket=2,
+        ) as conn:
+            response = await conn.send_command(COMMAND_MAP[platform])
+            return response.result
+
+
+class HostnameCheckMixin:
+    """Concurrent hostname check shared by the jobs of this module."""
+
+    def verify_concurrently(self, devices, batch_size=BATCH_SIZE):
+        """Check all devices over async SSH, writing the job log in batches, and return the log counts."""
+        with JobLogBuffer(self, batch_size=batch_size) as log:
+            # Database lookups are not allowed inside the event loop, resolve everything first
+            targets = []
+            for target in load_inventory(devices):
+
+                # Validate the Device has a primary IP set
+                if not target.host:
+                    log.log_failure(target.device, "Missing Primary IP")
+                    continue
+
+                # Validate the Device Platform is set and is supported by the script
+                if not target.platform in COMMAND_MAP:
+                    log.log_failure(target.device, "Check Platform slug supported device_types.")
+                    continue
+
+                targets.append(target)
+
+            asyncio.run(self.verify_targets(targets, log))
+        return log.counts
+
+    async def verify_targets(self, targets, log):
+        """Run the hostname check of every InventoryDevice target, at most MAX_CONCURRENCY at a time."""
+        semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        loop = asyncio.get_running_loop()
+
+        async def verify(device, host, platform):
+            # Make sure to be able to gracefully catch an exception and log a failure
+            try:
+                hostname = await fetch_hostname(host, platform, semaphore)
+
+            # Catch Authentication issue and log the failure
+            except ScrapliAuthenticationFailed:
+                log.log_failure(device, "Authentication error.")
+
+            # Catch timeout issue and log the failure
+            except (ScrapliTimeout, asyncio.TimeoutError):
+                log.log_failure(device, "Timeout error.")
+
+            # Catch unaccounted issue and log the failure
+            except Exception:
+                log.log_failure(device, "Unknown error.")
+
+            else:
+                # Remove any unneeded extra data from the return
+                hostname = re.sub(r"(host\-name|hostname|\s|\;|\n)", "", hostname)
+
+                # Check if the hostname matches the expected pattern
+                if HOSTNAME_PATTERN.match(hostname):
+                    log.log_success(device, "Configured hostname is correct.")
+                else:
+                    log.log_failure(device, "Does Not Match Hostname Pattern.")
+
+            # Write a batch of log entries from a worker thread, the database is synchronous only
+            if log.full:
+                await loop.run_in_executor(None, log.flush)
+
+        await asyncio.gather(*(verify(*target) for target in targets))
+
+    def verify_shard(self, devices, report, shard):
+        """Check one shard of a multi-site run and hand its counts to the merged report."""
+        start = time.monotonic()
+        counts = self.verify_concurrently(devices, batch_size=STREAM_BATCH_SIZE)
+        report.add(self, shard, counts, time.monotonic() - start)
 
 
-class VerifyHostnameNoInput(Job):
+class VerifyHostnameNoInput(HostnameCheckMixin, Job):
     """Job without inputs."""
 
     # Specify a job input of a Dynamic Choice Field with all Sites
     site = ObjectVar(model=Site)
 
+    # Specify a job input to check all devices at once over async SSH
+    concurrent = BooleanVar(
+        default=True, label="Concurrent", description="Check all devices of the Site at the same time."
+    )
+
     class Meta:
         """Meta object boilerplate for intended."""
 
@@ -36,34 +156,39 @@ class VerifyHostnameNoInput(Job):
         # Get Site instance based on job submission
         site = data.get("site")
 
+        # Check every device of the site at once, the runtime is about the one of the slowest device
+        if data.get("concurrent"):
+            self.verify_concurrently(Device.objects.filter(site=site))
+            return
+
         # Iterate through each Device object, limited to just the site of from job submission
-        for device in Device.objects.filter(site=site):
+        for device, host, platform in load_inventory(Device.objects.filter(site=site)):
 
             # Validate the Device has a primary IP set
-            if not device.primary_ip:
+            if not host:
                 self.log_failure(device, "Missing Primary IP")
                 # Skip to next iteration of the list
                 continue
 
             # Validate the Device Platform is set and is supported by the script
-            if not device.platform or not device.platform.slug in COMMAND_MAP:
+            if not platform in COMMAND_MAP:
                 self.log_failure(device, "Check Platform slug supported device_types.")
                 # Skip to next iteration of the list
                 continue
 
             # Make sure to be able to gracefully catch an exception and log a failure
             try:
-                # Build connection to Device
-                with ConnectHandler(
-                    device_type=device.platform.slug,
-                    host=str(device.primary_ip.address.ip),
+                # Build connection to Device, reusing an open session when there is one
+                with get_pool().connection(
+                    device_type=platform,
+                    host=host,
                     username=settings.NAPALM_USERNAME,
                     password=settings.NAPALM_PASSWORD,
                     conn_timeout=2,
                 ) as conn:
 
                     # Send a Platform specific command to get configured hostname
-                    hostname = conn.send_command(COMMAND_MAP[device.platform.slug])
+                    hostname = conn.send_command(COMMAND_MAP[platform])
 
                     # Remove any unneeded extra data from the return
                     hostname = re.sub(r"(host\-name|hostname|\s|\;|\n)", "", hostname)
@@ -88,3 +213,95 @@ class VerifyHostnameNoInput(Job):
             # Catch unaccounted issue and log the failure
             except:
                 self.log_failure(device, "Unknown error.")
+
+        # Report how many SSH sessions were reused from previous runs
+        get_pool().log_stats(self)
+
+
+class VerifyHostnameMultiSite(HostnameCheckMixin, Job):
+    """Job checking the devices of several Sites, Regions or a Dynamic Group in one run."""
+
+    # Specify job inputs selecting the devices, every selection is added to the scope
+    sites = MultiObjectVar(model=Site, required=False)
+    regions = MultiObjectVar(
+        model=Region, required=False, description="Check every Site of these Regions and of their child Regions."
+    )
+    dynamic_group = ObjectVar(model=DynamicGroup, required=False, description="Dynamic Group of Devices to check.")
+
+    # Specify a job input to split the devices across several job workers
+    shards = IntegerVar(
+        default=1,
+        min_value=1,
+        max_value=MAX_SHARDS,
+        description="Number of job workers the devices are split across.",
+    )
+
+    class Meta:
+        """Meta object boilerplate for intended."""
+
+        name = "Verify Hostname Pattern For Many Sites"
+        description = "Checks all devices of several Sites, Regions or a Dynamic Group for configured hostname pattern."
+        field_order = ["sites", "regions", "dynamic_group", "shards"]
+
+    def run(self, data, commit):
+        """Run method splitting the devices in shards and checking the first one."""
+        if not (data.get("sites") or data.get("regions") or data.get("dynamic_group")):
+            self.log_failure(message="Select at least one Site, Region or Dynamic Group.")
+            return
+
+        group = data.get("dynamic_group")
+        if group and group.content_type.model_class() is not Device:
+            self.log_failure(group, "Dynamic Group is not a group of Devices.")
+            return
+
+        scope = Q()
+        if data.get("sites"):
+            scope |= Q(site__in=data["sites"])
+        if data.get("regions"):
+            scope |= Q(site__region__in=Region.objects.get_queryset_descendants(data["regions"], include_self=True))
+        if group:
+            scope |= Q(pk__in=group.members.values("pk"))
+
+        # Keep the devices of a site together, so a shard talks to as few sites as possible
+        devices = Device.objects.filter(scope).order_by("site__name", "name")
+        devices = [str(pk) for pk in devices.values_list("pk", flat=True)]
+        if not devices:
+            self.log_warning(message="No devices in the selected scope.")
+            return
+
+        shards = split(devices, data.get("shards") or 1)
+        report = ShardReport(self.job_result.pk, len(shards))
+        report.start()
+
+        # The other shards are queued first, so they run on other workers while this one checks the first shard
+        enqueue_shards(
+            self,
+            VerifyHostnameShard,
+            [
+                {"devices": shard_devices, "report": str(self.job_result.pk), "shards": len(shards), "shard": shard}
+                for shard, shard_devices in enumerate(shards[1:], start=1)
+            ],
+            commit,
+        )
+        self.log_info(message=f"{len(devices)} devices split in {len(shards)} shards")
+        self.verify_shard(Device.objects.filter(pk__in=shards[0]), report, 0)
+
+
+class VerifyHostnameShard(HostnameCheckMixin, Job):
+    """Job checking one shard of a Verify Hostname Pattern For Many Sites run."""
+
+    devices = MultiObjectVar(model=Device)
+    report = StringVar(description="JobResult the merged report is written to.")
+    shards = IntegerVar(min_value=1, max_value=MAX_SHARDS)
+    shard = IntegerVar(min_value=0, max_value=MAX_SHARDS)
+
+    class Meta:
+        """Meta object boilerplate for intended."""
+
+        name = "Verify Hostname Pattern Shard"
+        description = "Checks one shard of the devices of a Verify Hostname Pattern For Many Sites run."
+        hidden = True
+
+    def run(self, data, commit):
+        """Run method checking the devices of the shard."""
+        self.verify_shard(data["devices"], ShardReport(data["report"], data["shards"]), data["shard"])
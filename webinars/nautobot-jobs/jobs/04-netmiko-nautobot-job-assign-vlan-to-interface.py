@@ -1,4 +1,9 @@
 """Add VLAN to Device."""
+import os
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from dotenv import dotenv_values
 variables = dotenv_values("/vault/secrets/secrets.env")
 def get_var(variable_name, default_value=None):
@@ -6,9 +11,15 @@ def get_var(variable_name, default_value=None):
 
 from django.conf import settings
 from nautobot.dcim.models import Device, Site, Interface
-from nautobot.extras.jobs import Job, ObjectVar, StringVar
-from netmiko import ConnectHandler
-from netmiko.exceptions import NetmikoTimeoutException, NetmikoAuthenticationException
+from nautobot.extras.jobs import Job, ObjectVar, StringVar, TextVar
+from netmiko.exceptions import ConfigInvalidException, NetmikoTimeoutException, NetmikoAuthenticationException
+
+# Nautobot loads job modules by file path, make the helper modules next to this file importable
+if os.path.dirname(__file__) not in sys.path:
+    sys.path.append(os.path.dirname(__file__))
+
+from bulk_input import parse_rows
+from connection_pool import get_pool
 
 
 # Easy mapping of platform to device command
@@ -16,6 +27,60 @@ COMMAND_MAP = {
     "cisco_nxos": "interface %s\nswitchport access vlan %s",
     "arista_eos": "interface %s\nswitchport access vlan %s",
 }
+# Columns of a bulk VLAN assignment
+ASSIGNMENT_FIELDS = ["device", "interface", "vlan"]
+# Maximum number of devices configured at the same time in bulk mode
+MAX_WORKERS = 10
+# Output of a configuration line rejected by the device
+ERROR_PATTERN = r"% ?(Invalid|Incomplete|Ambiguous|Error)"
+
+
+def parse_assignments(text):
+    """Parse a YAML list or a CSV table (with a header row) of VLAN assignments into a list of dicts."""
+    assignments = parse_rows(text, ASSIGNMENT_FIELDS, label="Assignment")
+    for assignment in assignments:
+        assignment["vlan"] = str(assignment["vlan"])
+    return assignments
+
+
+def configure_device(device, changes):
+    """Push the (interface, vlan) changes of a device in one config session.
+
+    Returns an (interface, vlan, error) tuple per change, error is None when the change
+    was accepted. Changes not sent before the session failed get the session error.
+    """
+    results = []
+    try:
+        # Build connection to Device, reusing an open session when there is one
+        with get_pool().connection(
+            device_type=device.platform.slug,
+            host=device.name,
+            username=get_var("NAUTOBOT_NAPALM_USERNAME"),
+            password=get_var("NAUTOBOT_NAPALM_PASSWORD"),
+            conn_timeout=2,
+        ) as conn:
+            conn.config_mode()
+            try:
+                for iface, vlan in changes:
+                    # A rejected line only fails its own interface, the session carries on with the next one
+                    commands = COMMAND_MAP[device.platform.slug] % (iface.name, vlan)
+                    try:
+                        conn.send_config_set(
+                            commands.split("\n"),
+                            enter_config_mode=False,
+                            exit_config_mode=False,
+                            error_pattern=ERROR_PATTERN,
+                        )
+                    except ConfigInvalidException as error:
+                        results.append((iface, vlan, error))
+                    else:
+                        results.append((iface, vlan, None))
+            finally:
+                conn.exit_config_mode()
+
+    except Exception as error:
+        results.extend((iface, vlan, error) for iface, vlan in changes[len(results) :])
+    return results
 
 
 class VerifyHostnameNoInput(Job):
@@ -54,8 +119,8 @@ class VerifyHostnameNoInput(Job):
 
         # Make sure to be able to gracefully catch an exception and log a failure
         try:
-            # Build connection to Device
-            with ConnectHandler(
+            # Build connection to Device, reusing an open session when there is one
+            with get_pool().connection(
                 device_type=device.platform.slug,
                 host=device.name,
                 username=get_var("NAUTOBOT_NAPALM_USERNAME"),
@@ -77,3 +142,77 @@ class VerifyHostnameNoInput(Job):
             self.log_failure(
                 iface, f"VLAN {vlan} failed to add to {iface.name} on {device.name}."
             )
+
+        # Report how many SSH sessions were reused from previous runs
+        get_pool().log_stats(self)
+
+
+class AddVlanToInterfaces(Job):
+    """Job adding VLANs to many Interfaces, with one config session per Device."""
+
+    # Specify a job input with the (device, interface, vlan) assignments
+    assignments = TextVar(description="YAML list or CSV table with the columns device, interface and vlan")
+
+    class Meta:
+        """Meta object boilerplate for intended."""
+
+        name = "Add VLANs to many Interfaces"
+        description = "Configures VLANs on many Interfaces, the Devices are configured in parallel."
+
+    def run(self, data, commit):
+        """Run method for implementing the VLANs, grouped per Device."""
+        try:
+            assignments = parse_assignments(data.get("assignments"))
+        except ValueError as error:
+            self.log_failure(message=str(error))
+            return
+
+        # Resolve every Device and Interface up front, in one query each
+        devices = {
+            device.name: device
+            for device in Device.objects.filter(
+                name__in={assignment["device"] for assignment in assignments}
+            ).select_related("platform")
+        }
+        interfaces = {
+            (iface.device.name, iface.name): iface
+            for iface in Interface.objects.filter(
+                device__in=devices.values(), name__in={assignment["interface"] for assignment in assignments}
+            ).select_related("device")
+        }
+
+        changes = defaultdict(list)
+        for assignment in assignments:
+            device = devices.get(assignment["device"])
+            if not device:
+                self.log_failure(message=f"Device {assignment['device']} does not exist.")
+                continue
+
+            # Validate the Device Platform is set and is supported by the script
+            if not device.platform or not device.platform.slug in COMMAND_MAP:
+                self.log_failure(device, "Not supported on routers. Check Platform slug supported device_types.")
+                continue
+
+            iface = interfaces.get((device.name, assignment["interface"]))
+            if not iface:
+                self.log_failure(device, f"Interface {assignment['interface']} does not exist on {device.name}.")
+                continue
+
+            changes[device].append((iface, assignment["vlan"]))
+
+        # Configure the Devices in parallel, each outcome is logged from here as its Device finishes
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {
+                executor.submit(configure_device, device, device_changes): device
+                for device, device_changes in changes.items()
+            }
+            for future in as_completed(futures):
+                device = futures[future]
+                for iface, vlan, error in future.result():
+                    if error is None:
+                        self.log_success(iface, f"Successfully added VLAN {vlan} to {iface.name} on {device.name}!")
+                    else:
+                        self.log_failure(iface, f"VLAN {vlan} failed to add to {iface.name} on {device.name}.")
+
+        # Report how many SSH sessions were reused from previous runs
+        get_pool().log_stats(self)
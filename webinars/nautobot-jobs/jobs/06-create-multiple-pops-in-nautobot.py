@@ -0,0 +1,76 @@
+"""Job to create many sites of type POP in a single run."""
+import os
+import sys
+
+from nautobot.extras.jobs import Job
+from nautobot.dcim.models import Region
+from nautobot.extras.jobs import *
+from nautobot.tenancy.models import Tenant
+
+# Nautobot loads job modules by file path, make the helper modules next to this file importable
+if os.path.dirname(__file__) not in sys.path:
+    sys.path.append(os.path.dirname(__file__))
+
+from bulk_input import parse_rows
+from pop_planner import PopPlanner, build_pops
+
+
+name = "Create multiple POPs"
+
+POP_FIELDS = ["site_name", "site_code", "site_facility", "leaf_count"]
+MAX_LEAF_COUNT = 12
+
+
+def parse_pops(text):
+    """Parse a YAML list or a CSV table (with a header row) of POPs into a list of dicts."""
+    pops = parse_rows(text, POP_FIELDS, label="POP")
+    for line, pop in enumerate(pops, start=1):
+        pop["leaf_count"] = int(pop["leaf_count"])
+        if not 1 <= pop["leaf_count"] <= MAX_LEAF_COUNT:
+            raise ValueError(f"POP #{line} leaf_count must be between 1 and {MAX_LEAF_COUNT}")
+
+    # Lower numbered POPs of a location first, dark fiber is built towards them
+    return sorted(pops, key=lambda pop: pop["site_code"].lower())
+
+
+class CreatePops(Job):
+    """Job to create many sites of type POP."""
+
+    class Meta:
+        """Meta class for CreatePops."""
+
+        name = "Create multiple POPs"
+        description = """
+        Create several Sites of Type POP at once, each with 2 Edge Routers and N leaf switches.
+        POPs are given as a YAML list or a CSV table with the columns site_name, site_code,
+        site_facility and leaf_count.
+        """
+        label = "POP"
+        field_order = [
+            "tenant",
+            "region",
+            "pops",
+        ]
+
+    tenant = ObjectVar(model=Tenant)
+
+    region = ObjectVar(model=Region)
+
+    pops = TextVar(description="YAML list or CSV table of POPs to create", label="POPs")
+
+    def run(self, data=None, commit=None):
+        """Main function for CreatePops."""
+        planners = [
+            PopPlanner(
+                self,
+                tenant=data["tenant"],
+                region=data["region"],
+                site_name=pop["site_name"],
+                site_code=pop["site_code"],
+                site_facility=pop["site_facility"],
+                leaf_count=pop["leaf_count"],
+            )
+            for pop in parse_pops(data["pops"])
+        ]
+        build_pops(self, planners)
+        self.log_success(message=f"{len(planners)} POPs successfully created")
@@ -0,0 +1,26 @@
+"""Parse the rows of a bulk job input given as a YAML list or a CSV table."""
+import csv
+import io
+
+import yaml
+
+
+def parse_rows(text, fields, label="Row"):
+    """Parse a YAML list or a CSV table (with a header row) into a list of dicts.
+
+    Raise ValueError naming the row, counted from 1 and called `label` in the message,
+    when a row has no value for one of `fields`.
+    """
+    try:
+        rows = yaml.safe_load(text)
+    except yaml.YAMLError:
+        rows = None
+
+    if not isinstance(rows, list):
+        rows = list(csv.DictReader(io.StringIO(text.strip())))
+
+    for line, row in enumerate(rows, start=1):
+        missing = [field for field in fields if not row.get(field)]
+        if missing:
+            raise ValueError(f"{label} #{line} is missing {', '.join(missing)}")
+    return rows
@@ -0,0 +1,195 @@
+"""Worker-local pool of netmiko SSH sessions reused across job runs."""
+import hashlib
+import sys
+import threading
+import time
+import types
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from netmiko import ConnectHandler
+
+# Seconds an idle session is kept open
+IDLE_TIMEOUT = 300
+# Maximum number of sessions kept open by a worker, in use or idle
+MAX_SIZE = 50
+# Seconds between two sweeps of the idle sessions by the background thread
+SWEEP_INTERVAL = 30
+
+
+class ConnectionPool:
+    """Keep netmiko sessions open between jobs, keyed by (host, platform, credentials).
+
+    A session is handed to one caller at a time. Idle sessions are checked with
+    `is_alive()` before reuse, and the least recently used ones are evicted when the
+    pool grows over MAX_SIZE. A daemon thread closes the sessions idle for more than
+    IDLE_TIMEOUT seconds every `sweep_interval` seconds, even when no job runs anymore.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, max_size=MAX_SIZE, sweep_interval=SWEEP_INTERVAL):
+        """Initializer."""
+        self.idle_timeout = idle_timeout
+        self.max_size = max_size
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        # key -> list of (last used, connection), least recently used pool entries first
+        self._idle = OrderedDict()
+        self._in_use = 0
+        self.handshakes = 0
+        self.reuses = 0
+        self.handshake_time = 0.0
+        if sweep_interval:
+            threading.Thread(target=self._sweep_forever, name="connection-pool-sweep", daemon=True).start()
+
+    @staticmethod
+    def make_key(device_type, host, username, password):
+        """Build the pool key of a session, without keeping the password in clear."""
+        digest = hashlib.sha256(f"{username}:{password}".encode()).hexdigest()
+        return host, device_type, digest
+
+    @contextmanager
+    def connection(self, device_type, host, username, password, **kwargs):
+        """Yield an open session to a device, returning it to the pool once done.
+
+        A session that raised an exception is closed instead of being returned.
+        """
+        key = self.make_key(device_type, host, username, password)
+        conn = self._checkout(key)
+        if conn is None:
+            start = time.monotonic()
+            try:
+                conn = ConnectHandler(
+                    device_type=device_type, host=host, username=username, password=password, **kwargs
+                )
+            except Exception:
+                with self._lock:
+                    self._in_use -= 1
+                raise
+            with self._lock:
+                self.handshakes += 1
+                self.handshake_time += time.monotonic() - start
+
+        try:
+            yield conn
+        except Exception:
+            self._discard(conn)
+            raise
+        else:
+            self._checkin(key, conn)
+
+    def _checkout(self, key):
+        """Return a healthy idle session for the key, or None when a new one must be opened."""
+        self.sweep()
+        while True:
+            with self._lock:
+                self._in_use += 1
+                sessions = self._idle.get(key)
+                if not sessions:
+                    # Make room for the session about to be opened
+                    evicted = self._evict()
+                    conn = None
+                else:
+                    _, conn = sessions.pop()
+                    if not sessions:
+                        del self._idle[key]
+
+            if conn is None:
+                self._disconnect(evicted)
+                return None
+
+            # Health check outside of the lock, it talks to the device
+            try:
+                alive = conn.is_alive()
+            except Exception:
+                alive = False
+            if alive:
+                with self._lock:
+                    self.reuses += 1
+                return conn
+            self._discard(conn)
+
+    def _checkin(self, key, conn):
+        with self._lock:
+            self._in_use -= 1
+            self._idle.setdefault(key, []).append((time.monotonic(), conn))
+            self._idle.move_to_end(key)
+            evicted = self._evict()
+        self._disconnect(evicted)
+
+    def _discard(self, conn):
+        with self._lock:
+            self._in_use -= 1
+        self._disconnect([conn])
+
+    def _evict(self):
+        """Pop least recently used idle sessions while the pool is over its size, caller holds the lock."""
+        evicted = []
+        while self._idle and self._in_use + sum(len(sessions) for sessions in self._idle.values()) > self.max_size:
+            key, sessions = next(iter(self._idle.items()))
+            evicted.append(sessions.pop(0)[1])
+            if not sessions:
+                del self._idle[key]
+        return evicted
+
+    def sweep(self):
+        """Close the sessions that stayed idle for longer than the idle timeout."""
+        expired = []
+        deadline = time.monotonic() - self.idle_timeout
+        with self._lock:
+            for key in list(self._idle):
+                sessions = self._idle[key]
+                expired.extend(conn for last_used, conn in sessions if last_used < deadline)
+                sessions[:] = [(last_used, conn) for last_used, conn in sessions if last_used >= deadline]
+                if not sessions:
+                    del self._idle[key]
+        self._disconnect(expired)
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception:
+                # The sweep is retried on the next interval, the thread must not die
+                pass
+
+    @staticmethod
+    def _disconnect(connections):
+        for conn in connections:
+            try:
+                conn.disconnect()
+            except Exception:
+                pass
+
+    def stats(self):
+        """Return the reuse rate and the handshake time saved by reusing sessions."""
+        total = self.handshakes + self.reuses
+        average = self.handshake_time / self.handshakes if self.handshakes else 0
+        return {
+            "handshakes": self.handshakes,
+            "reuses": self.reuses,
+            "reuse_rate": self.reuses / total if total else 0,
+            "handshake_time_saved": self.reuses * average,
+        }
+
+    def log_stats(self, job):
+        """Report the pool metrics in the job log."""
+        stats = self.stats()
+        job.log_info(
+            message=(
+                f"SSH pool: {stats['reuses']} reused / {stats['handshakes']} new sessions "
+                f"({stats['reuse_rate']:.0%} reuse), ~{stats['handshake_time_saved']:.1f}s of handshakes saved"
+            )
+        )
+
+
+# Job modules are imported again on every run, the pool is kept in its own module so it outlives them
+_REGISTRY = sys.modules.setdefault("_nautobot_jobs_connection_pool", types.ModuleType("_nautobot_jobs_connection_pool"))
+
+
+def get_pool():
+    """Return the connection pool of this worker process."""
+    if not hasattr(_REGISTRY, "pool"):
+        # dict.setdefault is atomic, two threads racing here still end up with the same pool
+        vars(_REGISTRY).setdefault("pool", ConnectionPool())
+    return _REGISTRY.pool
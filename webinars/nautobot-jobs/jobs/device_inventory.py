@@ -0,0 +1,32 @@
+"""Stream the devices a job connects to, with their primary IP and platform."""
+from collections import namedtuple
+
+from nautobot.utilities.config import get_settings_or_config
+
+# Number of devices fetched per round trip while streaming
+CHUNK_SIZE = 2000
+
+InventoryDevice = namedtuple("InventoryDevice", ["device", "host", "platform"])
+
+
+def load_inventory(devices, chunk_size=CHUNK_SIZE):
+    """Yield an InventoryDevice for every device of a queryset, streamed in chunks.
+
+    Primary IPs and platforms are joined into the device query, so the number of queries
+    does not grow with the number of devices. `host` and `platform` are None when the
+    device has no primary IP or platform.
+    """
+    # Device.primary_ip reads PREFER_IPV4 on every call, which may be a query to the config table
+    prefer_ipv4 = get_settings_or_config("PREFER_IPV4")
+    devices = devices.select_related("platform", "primary_ip4", "primary_ip6")
+
+    for device in devices.iterator(chunk_size=chunk_size):
+        if prefer_ipv4:
+            primary_ip = device.primary_ip4 or device.primary_ip6
+        else:
+            primary_ip = device.primary_ip6 or device.primary_ip4
+        yield InventoryDevice(
+            device=device,
+            host=str(primary_ip.address.ip) if primary_ip else None,
+            platform=device.platform.slug if device.platform else None,
+        )
@@ -0,0 +1,104 @@
+"""Job log that writes its entries in batches instead of one database write per message."""
+import logging
+import threading
+from collections import Counter
+
+from django.utils import timezone
+
+from nautobot.extras.choices import LogLevelChoices
+from nautobot.extras.constants import (
+    JOB_LOG_MAX_ABSOLUTE_URL_LENGTH,
+    JOB_LOG_MAX_GROUPING_LENGTH,
+    JOB_LOG_MAX_LOG_OBJECT_LENGTH,
+)
+from nautobot.extras.models import JobLogEntry
+from nautobot.extras.models.jobs import JOB_LOGS
+from nautobot.utilities.logging import sanitize
+
+# Number of entries written per bulk insert
+BATCH_SIZE = 100
+
+LOGGER_LEVELS = {
+    LogLevelChoices.LOG_FAILURE: logging.ERROR,
+    LogLevelChoices.LOG_WARNING: logging.WARNING,
+}
+
+
+class JobLogBuffer:
+    """Collect job log entries in memory and write them with bulk_create.
+
+    Offers the log_success/log_info/log_warning/log_failure API of a Job and builds the
+    same JobLogEntry rows as JobResult.log(). Entries are written once BATCH_SIZE of them
+    are pending, on flush() and when the buffer is used as a context manager and exits.
+    Building entries never touches the database, so it is safe from async code, while
+    flush() must run in a synchronous context.
+    """
+
+    def __init__(self, job, batch_size=BATCH_SIZE, job_result=None):
+        """Initializer, entries go to the JobResult of the job unless another one is given."""
+        self.job = job
+        self.job_result = job_result or job.job_result
+        self.batch_size = batch_size
+        self._entries = []
+        self._lock = threading.Lock()
+        # Number of entries logged per (log level, message), kept after the entries are written
+        self.counts = Counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    @property
+    def full(self):
+        """Whether a batch of entries is waiting to be written."""
+        return len(self._entries) >= self.batch_size
+
+    def _log(self, obj, message, level_choice):
+        message = sanitize(str(message))
+        entry = JobLogEntry(
+            job_result=self.job_result,
+            log_level=level_choice,
+            grouping=self.job.active_test[:JOB_LOG_MAX_GROUPING_LENGTH],
+            message=message,
+            created=timezone.now().isoformat(),
+            log_object=str(obj)[:JOB_LOG_MAX_LOG_OBJECT_LENGTH] if obj else None,
+            absolute_url=obj.get_absolute_url()[:JOB_LOG_MAX_ABSOLUTE_URL_LENGTH]
+            if hasattr(obj, "get_absolute_url")
+            else None,
+        )
+        with self._lock:
+            self._entries.append(entry)
+            self.counts[(level_choice, message)] += 1
+        self.job.logger.log(LOGGER_LEVELS.get(level_choice, logging.INFO), message)
+
+    def log_success(self, obj=None, message=None):
+        """Buffer a success entry."""
+        self._log(obj, message, LogLevelChoices.LOG_SUCCESS)
+
+    def log_info(self, obj=None, message=None):
+        """Buffer an informational entry."""
+        self._log(obj, message, LogLevelChoices.LOG_INFO)
+
+    def log_warning(self, obj=None, message=None):
+        """Buffer a warning entry."""
+        self._log(obj, message, LogLevelChoices.LOG_WARNING)
+
+    def log_failure(self, obj=None, message=None):
+        """Buffer a failure entry, marking the job as failed right away."""
+        self._log(obj, message, LogLevelChoices.LOG_FAILURE)
+        self.job.failed = True
+
+    def flush(self):
+        """Write every pending entry in a single bulk insert."""
+        with self._lock:
+            entries, self._entries = self._entries, []
+        if not entries:
+            return
+
+        # Same database choice as JobResult.log(), so entries survive a rolled back job
+        if not self.job_result.use_job_logs_db or not JOB_LOGS:
+            JobLogEntry.objects.bulk_create(entries)
+        else:
+            JobLogEntry.objects.using(JOB_LOGS).bulk_create(entries)
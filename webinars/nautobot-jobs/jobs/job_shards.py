@@ -0,0 +1,105 @@
+"""Split a job over several workers and merge the reports of its shards once the last one is done."""
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import connection
+
+from nautobot.extras.choices import LogLevelChoices
+from nautobot.extras.jobs import run_job
+from nautobot.extras.models import JobResult
+from nautobot.extras.utils import get_job_content_type
+
+from job_log_buffer import JobLogBuffer
+
+# Seconds the shard reports are kept in the cache waiting for the other shards
+REPORT_TIMEOUT = 6 * 60 * 60
+
+
+def split(items, shards):
+    """Split a list into at most `shards` contiguous slices of about the same size."""
+    size = max(1, -(-len(items) // shards))
+    return [items[start : start + size] for start in range(0, len(items), size)]
+
+
+def enqueue_shards(job, shard_class, shard_data, commit):
+    """Queue one run of shard_class per data dict, picked up by any free job worker.
+
+    The JobResults are created from another thread, with its own database connection, so
+    they are committed right away instead of with the transaction of the calling job,
+    which a dry-run rolls back.
+    """
+
+    def enqueue():
+        try:
+            return [
+                JobResult.enqueue_job(
+                    run_job,
+                    shard_class.class_path,
+                    get_job_content_type(),
+                    job.request.user,
+                    data=shard_class.serialize_data(data),
+                    request=job.request,
+                    commit=commit,
+                )
+                for data in shard_data
+            ]
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(enqueue).result()
+
+
+class ShardReport:
+    """Merge the log counts of every shard of a run into one report on the JobResult that started it.
+
+    Each shard hands its JobLogBuffer counts to `add()` once done. They are kept in the
+    Django cache (Redis), so whichever worker finishes the last shard sees all of them
+    and writes the merged report.
+    """
+
+    def __init__(self, job_result_pk, shards):
+        """Initializer."""
+        self.job_result_pk = job_result_pk
+        self.shards = shards
+        self.key = f"job-shards:{job_result_pk}"
+
+    def start(self):
+        """Reset the counter of finished shards, before any shard is started."""
+        cache.set(f"{self.key}:done", 0, REPORT_TIMEOUT)
+
+    def add(self, job, shard, counts, duration):
+        """Store the counts of a finished shard, and write the merged report if it was the last one."""
+        cache.set(f"{self.key}:{shard}", {"counts": counts, "duration": duration}, REPORT_TIMEOUT)
+        if cache.incr(f"{self.key}:done") < self.shards:
+            return
+
+        keys = [f"{self.key}:{index}" for index in range(self.shards)]
+        reports = cache.get_many(keys)
+        cache.delete_many([*keys, f"{self.key}:done"])
+
+        merged = Counter()
+        for report in reports.values():
+            merged.update(report["counts"])
+        self.write(job, merged, max(report["duration"] for report in reports.values()))
+
+    def write(self, job, counts, duration):
+        """Log the totals and the number of devices per failure reason on the JobResult of the run."""
+        levels = Counter()
+        for (level, _), count in counts.items():
+            levels[level] += count
+
+        summary = (
+            f"Merged report of {self.shards} shards: {sum(levels.values())} devices checked in {duration:.1f}s, "
+            f"{levels[LogLevelChoices.LOG_SUCCESS]} passed, {levels[LogLevelChoices.LOG_FAILURE]} failed"
+        )
+        with JobLogBuffer(job, job_result=JobResult.objects.get(pk=self.job_result_pk)) as log:
+            if levels[LogLevelChoices.LOG_FAILURE]:
+                log.log_warning(message=summary)
+            else:
+                log.log_success(message=summary)
+
+            for (level, message), count in counts.most_common():
+                if level == LogLevelChoices.LOG_FAILURE:
+                    log.log_warning(message=f"{count} devices: {message}")
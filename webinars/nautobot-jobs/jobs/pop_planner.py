@@ -0,0 +1,707 @@
+"""Plan a POP in memory and write it to Nautobot in a few dependency ordered batches."""
+import re
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from ipaddress import IPv4Network
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.utils.text import slugify
+
+from nautobot.dcim.models import Site, Device, DeviceType, DeviceRole, Interface, Cable, Rack, Platform
+from nautobot.dcim.choices import RackTypeChoices, InterfaceTypeChoices
+from nautobot.ipam.models import VLAN, IPAddress, Prefix, Role
+from nautobot.circuits.models import Circuit, Provider, CircuitType, CircuitTermination
+from nautobot.extras.models import CustomField, Relationship, RelationshipAssociation
+from nautobot.extras.choices import RelationshipTypeChoices
+
+from prefix_allocator import SubnetAllocator
+from reference_cache import ReferenceCache
+
+ROLES = {
+    "edge": {
+        "nbr": 2,
+        "device_type": "dcs-7280cr2-60",
+        "platform": "arista_eos",
+        "rack_elevation": 40,
+        "color": "ff9800",
+        "interfaces": [
+            ("peer", 2),
+            ("leaf", 12),
+            ("external", 8),
+        ],
+    },
+    "leaf": {
+        "nbr": 6,
+        "device_type": "dcs-7150s-24",
+        "platform": "arista_eos",
+        "rack_elevation": 44,
+        "color": "3f51b5",
+        "interfaces": [
+            ("edge", 4),
+            ("access", 20),
+        ],
+    },
+}
+
+CUSTOM_FIELDS = {
+    "role": {"models": [Interface], "label": "Role"},
+    "site_type": {"models": [Site], "label": "Type of Site"},
+}
+
+RELATIONSHIPS = {
+    "Device to Vlan": {
+        "source_type": Device,
+        "destination_type": VLAN,
+        "type": RelationshipTypeChoices.TYPE_MANY_TO_MANY,
+    },
+    "Rack to Vlan": {
+        "source_type": Rack,
+        "destination_type": VLAN,
+        "type": RelationshipTypeChoices.TYPE_ONE_TO_MANY,
+    },
+}
+
+TOP_LEVEL_PREFIX_ROLE = "POP Global Pool"
+PREFIX_ROLES = ["point-to-point", "loopback", "server", "mgmt", "pop"]
+
+P2P_PREFIX_SIZE = 31
+SITE_PREFIX_SIZE = 16
+
+VLANS = {
+    "server": {
+        "vlan_id": 1000,
+    },
+    "mgmt": {
+        "vlan_id": 99,
+    },
+}
+
+RACK_HEIGHT = 48
+RACK_TYPE = RackTypeChoices.TYPE_4POST
+
+
+TRANSIT_PROVIDERS = ["Telia Carrier", "NTT"]
+
+
+def create_custom_fields():
+    """Create all relationships defined in CUSTOM_FIELDS."""
+    for cf_name, field in CUSTOM_FIELDS.items():
+        try:
+            cf = CustomField.objects.get(name=cf_name)
+        except CustomField.DoesNotExist:
+            cf = CustomField.objects.create(name=cf_name)
+            if "label" in field:
+                cf.label = field.get("label")
+            cf.validated_save()
+
+        for model in field["models"]:
+            ct = ContentType.objects.get_for_model(model)
+            cf.content_types.add(ct)
+            cf.validated_save()
+
+
+def create_relationships():
+    """Create all relationships defined in RELATIONSHIPS."""
+    for rel_name, relationship in RELATIONSHIPS.items():
+        try:
+            rel = Relationship.objects.get(name=rel_name)
+        except Relationship.DoesNotExist:
+            rel = Relationship.objects.create(
+                name=rel_name,
+                slug=slugify(rel_name),
+                type=relationship.get("type", RelationshipTypeChoices.TYPE_MANY_TO_MANY),
+                source_type=ContentType.objects.get_for_model(relationship.get("source_type")),
+                destination_type=ContentType.objects.get_for_model(relationship.get("destination_type")),
+            )
+            rel.validated_save()
+
+
+def create_prefix_roles():
+    """Create all Prefix Roles defined in PREFIX_ROLES."""
+    for role in PREFIX_ROLES:
+        Role.objects.get_or_create(name=role, slug=slugify(role))
+
+
+def circuit_id_for(provider, site_code, intf):
+    """Build a stable circuit ID from the provider, the site and the local interface."""
+    regex = re.compile("[^a-zA-Z0-9]")
+    clean_name = regex.sub("", f"{site_code}{intf.device.name[-4:]}{intf.name[-4:]}")
+    return slugify(f"{provider.name[0:3]}-{int(clean_name, 36)}")
+
+
+@contextmanager
+def phase(job, name):
+    """Run a build phase in a savepoint and log how many queries and how long it took."""
+    queries = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    start = time.monotonic()
+    with connection.execute_wrapper(count_queries), transaction.atomic():
+        yield
+    job.log_info(message=f"Phase {name}: {queries} queries in {time.monotonic() - start:.2f}s")
+
+
+def build_pops(job, planners):
+    """Build one or more POPs together, phase by phase.
+
+    All planners share one reference cache and one allocator for the top level prefix,
+    and dark fiber between POPs of the same batch is planned from memory.
+    """
+    with phase(job, "reference data"):
+        create_custom_fields()
+        create_relationships()
+        create_prefix_roles()
+        cache = ReferenceCache().warm()
+        for role, data in ROLES.items():
+            if not cache.get(DeviceRole, slugify(role)):
+                DeviceRole.objects.create(name=role, slug=slugify(role), color=data["color"])
+
+    shared_allocators = {}
+    for planner in planners:
+        planner.cache = cache
+        planner.shared_allocators = shared_allocators
+
+    batch = {planner.site_code: planner for planner in planners}
+    steps = [
+        ("site", "build_site", []),
+        ("racks", "build_racks", []),
+        ("devices", "build_devices", []),
+        ("addressing", "build_addressing", []),
+        ("cabling", "build_cabling", []),
+        ("transit circuits", "build_transit", []),
+        ("dark fiber", "build_dark_fiber", [batch]),
+    ]
+    for name, method, args in steps:
+        with phase(job, name):
+            for planner in planners:
+                getattr(planner, method)(*args)
+
+    cache.log_stats(job)
+
+
+class PopPlanner:
+    """Compute a whole POP in memory and write it with bulk operations.
+
+    The build is split in phases ordered by dependency (site, racks, devices, addressing,
+    cabling, circuits), see build_pops(). Each phase only plans objects that are missing from
+    the database and logs its query count and wall time. Phases are savepoints inside the
+    transaction of the job: a failure rolls back the whole run, and running the job again
+    for an existing site only creates what is missing.
+    """
+
+    def __init__(self, job, tenant, region, site_name, site_code, site_facility, leaf_count):
+        """Initializer."""
+        self.job = job
+        self.tenant = tenant
+        self.region = region
+        self.site_name = site_name
+        self.site_code = site_code.lower()
+        self.site_facility = site_facility
+        self.roles = {role: dict(data) for role, data in ROLES.items()}
+        self.roles["leaf"]["nbr"] = leaf_count
+
+        self.site = None
+        self.containers = {}
+        self.racks = {}
+        self.devices = {}
+        # Interfaces per device name, in Nautobot natural ordering
+        self.interfaces = defaultdict(list)
+        # One allocator per (prefix role, prefix length), loaded on first use
+        self.allocators = {}
+        # Set by build_pops, shared by every POP of a batch
+        self.cache = None
+        self.shared_allocators = {}
+
+    def build(self):
+        """Plan and write every phase of the POP, return the Site."""
+        build_pops(self.job, [self])
+        return self.site
+
+    def device_plan(self):
+        """Return (role, index, device name) for every device of the POP, edges first."""
+        return [
+            (role, i, f"{self.site_code}-{role}-{i:02}")
+            for role, data in self.roles.items()
+            for i in range(1, data.get("nbr", 2) + 1)
+        ]
+
+    # ----------------------------------------------------------------------------
+    # Find or Create Site and its Prefixes
+    # ----------------------------------------------------------------------------
+    def build_site(self):
+        """Find or create the Site and allocate its /16 and /18 containers."""
+        container_status = self.cache.status(Prefix, "container")
+        self.site, _ = Site.objects.get_or_create(
+            name=self.site_name,
+            region=self.region,
+            slug=self.site_code,
+            status=self.cache.status(Site, "active"),
+            facility=self.site_facility,
+            tenant=self.tenant,
+        )
+        self.site.custom_field_data["site_type"] = "POP"
+        self.site.validated_save()
+        self.job.log_success(self.site, f"Site {self.site_code} successfully created")
+
+        # Search if there is already a POP prefix associated with this side
+        # if not search the Top Level Prefix and create a new one
+        pop_role = self.cache.get(Role, "pop")
+        pop_prefix = Prefix.objects.filter(site=self.site, status=container_status, role=pop_role).first()
+
+        if not pop_prefix:
+            top_level_prefix = Prefix.objects.filter(
+                role__slug=slugify(TOP_LEVEL_PREFIX_ROLE), status=container_status
+            ).first()
+
+            if not top_level_prefix:
+                raise Exception("Unable to find the top level prefix to allocate a Network for this site")
+
+            if top_level_prefix.pk not in self.shared_allocators:
+                self.shared_allocators[top_level_prefix.pk] = SubnetAllocator(top_level_prefix, SITE_PREFIX_SIZE)
+            site_allocator = self.shared_allocators[top_level_prefix.pk]
+            prefix = site_allocator.allocate()
+            site_allocator.verify()
+            pop_prefix = Prefix.objects.create(
+                prefix=str(prefix), site=self.site, status=container_status, role=pop_role, tenant=self.tenant
+            )
+
+        # Allocate the subnet by block of /18
+        iter_subnet = IPv4Network(str(pop_prefix.prefix)).subnets(new_prefix=18)
+        for role in ["server", "mgmt", "loopback", "point-to-point"]:
+            self.containers[role], _ = Prefix.objects.get_or_create(
+                prefix=str(next(iter_subnet)),
+                site=self.site,
+                role=self.cache.get(Role, role),
+                status=container_status,
+                tenant=self.tenant,
+            )
+
+    def next_subnet(self, role, prefix_length):
+        """Return the next free subnet of the given size from the container of a prefix role."""
+        key = (role, prefix_length)
+        if key not in self.allocators:
+            self.allocators[key] = SubnetAllocator(self.containers[role], prefix_length, hosts=prefix_length == 32)
+        return self.allocators[key].allocate()
+
+    def verify_allocations(self):
+        """Fail before writing if a concurrent job created anything in the subnets planned so far."""
+        for allocator in self.allocators.values():
+            allocator.verify()
+
+    # ----------------------------------------------------------------------------
+    # Create Racks
+    # ----------------------------------------------------------------------------
+    def build_racks(self):
+        """Create one rack per leaf switch."""
+        self.racks = {rack.name: rack for rack in Rack.objects.filter(site=self.site)}
+        new_racks = []
+        for i in range(1, self.roles["leaf"]["nbr"] + 1):
+            rack_name = f"{self.site_code}-{100 + i}"
+            if rack_name in self.racks:
+                continue
+            rack = Rack(
+                name=rack_name,
+                site=self.site,
+                u_height=RACK_HEIGHT,
+                type=RACK_TYPE,
+                status=self.cache.status(Rack, "active"),
+                tenant=self.tenant,
+            )
+            self.racks[rack_name] = rack
+            new_racks.append(rack)
+        Rack.objects.bulk_create(new_racks)
+
+    # ----------------------------------------------------------------------------
+    # Create Devices
+    # ----------------------------------------------------------------------------
+    def build_devices(self):
+        """Create missing devices, then their roles, loopback and VLAN interfaces in bulk."""
+        plan = self.device_plan()
+        existing = {
+            device.name: device
+            for device in Device.objects.filter(name__in=[name for _, _, name in plan]).select_related("platform")
+        }
+
+        for role, i, device_name in plan:
+            data = self.roles[role]
+            platform = self.cache.get(Platform, data["platform"])
+            device = existing.get(device_name)
+            if device:
+                if not device.platform and platform:
+                    device.platform = platform
+                    device.validated_save()
+
+                self.devices[device_name] = device
+                self.job.log_success(obj=device, message=f"Device {device_name} already present")
+                continue
+
+            # Devices are saved one by one so Nautobot instantiates their components from the DeviceType
+            device = Device(
+                device_type=self.cache.get(DeviceType, data["device_type"]),
+                name=device_name,
+                site=self.site,
+                status=self.cache.status(Device, "active"),
+                device_role=self.cache.get(DeviceRole, slugify(role)),
+                rack=self.racks.get(f"{self.site_code}-{100 + i}"),
+                platform=platform,
+                position=data.get("rack_elevation"),
+                face="front",
+                tenant=self.tenant,
+            )
+            device.validated_save()
+            self.devices[device_name] = device
+            self.job.log_success(device, f"Device {device_name} successfully created")
+
+        self.load_interfaces()
+
+        roles_to_update = []
+        new_intfs = []
+        for role, i, device_name in plan:
+            device = self.devices[device_name]
+            intfs = self.interfaces[device_name]
+            intf_names = {intf.name for intf in intfs}
+
+            # Assign Role to Interfaces, unless a previous run already did
+            if not any(intf._custom_field_data.get("role") for intf in intfs):
+                physical = iter(intf for intf in intfs if intf.type != InterfaceTypeChoices.TYPE_VIRTUAL)
+                for int_role, cnt in self.roles[role]["interfaces"]:
+                    for _ in range(0, cnt):
+                        intf = next(physical)
+                        intf._custom_field_data = {"role": int_role}
+                        roles_to_update.append(intf)
+
+            virtual_names = ["Loopback0"]
+            if role == "leaf":
+                virtual_names.extend(f"vlan{vlan_data['vlan_id']}" for vlan_data in VLANS.values())
+            for intf_name in virtual_names:
+                if intf_name not in intf_names:
+                    intf = Interface(name=intf_name, type=InterfaceTypeChoices.TYPE_VIRTUAL, device=device)
+                    intfs.append(intf)
+                    new_intfs.append(intf)
+
+        Interface.objects.bulk_update(roles_to_update, ["_custom_field_data"])
+        Interface.objects.bulk_create(new_intfs)
+
+    def load_interfaces(self):
+        """Load the interfaces of every device of the POP in a single query."""
+        self.interfaces.clear()
+        for intf in Interface.objects.filter(device__in=list(self.devices.values())).select_related("device"):
+            self.interfaces[intf.device.name].append(intf)
+
+    def interfaces_with_role(self, device_name, role):
+        """Return the interfaces of a device with a given role, in natural ordering."""
+        return [intf for intf in self.interfaces[device_name] if intf._custom_field_data.get("role") == role]
+
+    # ----------------------------------------------------------------------------
+    # Loopbacks, VLANs and their Prefixes
+    # ----------------------------------------------------------------------------
+    def build_addressing(self):
+        """Allocate loopbacks and leaf VLANs with their Prefixes, IPs and relationships."""
+        ip_status = self.cache.status(IPAddress, "active")
+        prefix_status = self.cache.status(Prefix, "active")
+        vlan_status = self.cache.status(VLAN, "active")
+        rel_device_vlan = self.cache.get(Relationship, "Device to Vlan")
+        rel_rack_vlan = self.cache.get(Relationship, "Rack to Vlan")
+
+        ips_by_intf = defaultdict(list)
+        for ip in IPAddress.objects.filter(interface__device__site=self.site):
+            ips_by_intf[ip.assigned_object_id].append(ip)
+        vlans = {vlan.name: vlan for vlan in VLAN.objects.filter(site=self.site)}
+        vlan_subnets = {
+            prefix.vlan_id: IPv4Network(str(prefix.prefix))
+            for prefix in Prefix.objects.filter(site=self.site, vlan__isnull=False)
+        }
+        associations = set(
+            RelationshipAssociation.objects.filter(
+                relationship__in=[rel_device_vlan, rel_rack_vlan],
+                destination_id__in=[vlan.id for vlan in vlans.values()],
+            ).values_list("relationship_id", "source_id", "destination_id")
+        )
+
+        new_vlans, new_prefixes, new_ips, new_associations, devices_to_update = [], [], [], [], []
+        for role, i, device_name in self.device_plan():
+            device = self.devices[device_name]
+            intfs = {intf.name: intf for intf in self.interfaces[device_name]}
+
+            # Generate Loopback interface and assign Loopback
+            loopback_intf = intfs["Loopback0"]
+            if not ips_by_intf[loopback_intf.id]:
+                address = self.next_subnet("loopback", 32)
+                loopback_ip = IPAddress(
+                    address=str(address),
+                    assigned_object=loopback_intf,
+                    status=ip_status,
+                    tenant=self.tenant,
+                    dns_name=f"{role}-{i:02}.{self.site_code}.{self.tenant.description}",
+                )
+                ips_by_intf[loopback_intf.id].append(loopback_ip)
+                new_ips.append(loopback_ip)
+            if not device.primary_ip4:
+                device.primary_ip4 = ips_by_intf[loopback_intf.id][0]
+                devices_to_update.append(device)
+
+            if role != "leaf":
+                continue
+
+            rack_name = f"{self.site_code}-{100 + i}"
+            rack = self.racks[rack_name]
+            for vlan_name, vlan_data in VLANS.items():
+                prefix_role = self.cache.get(Role, vlan_name)
+                vlan = vlans.get(f"{rack_name}-{vlan_name}")
+                if not vlan:
+                    vlan = VLAN(
+                        vid=vlan_data["vlan_id"],
+                        name=f"{rack_name}-{vlan_name}",
+                        site=self.site,
+                        role=prefix_role,
+                        status=vlan_status,
+                        tenant=self.tenant,
+                    )
+                    new_vlans.append(vlan)
+
+                # Find Next available Network
+                subnet = vlan_subnets.get(vlan.id)
+                if not subnet:
+                    subnet = self.next_subnet(vlan_name, 24)
+                    vlan_subnets[vlan.id] = subnet
+                    new_prefixes.append(
+                        Prefix(
+                            prefix=str(subnet),
+                            vlan=vlan,
+                            status=prefix_status,
+                            role=prefix_role,
+                            site=self.site,
+                            tenant=self.tenant,
+                        )
+                    )
+
+                vlan_intf = intfs[f"vlan{vlan_data['vlan_id']}"]
+                if not ips_by_intf[vlan_intf.id]:
+                    new_ips.append(
+                        IPAddress(
+                            address=str(subnet[0]),
+                            assigned_object=vlan_intf,
+                            status=ip_status,
+                            tenant=self.tenant,
+                            dns_name=f"ip-{str(subnet[0]).replace('.', '-')}.{vlan_name}.{self.site_code}.{self.tenant.description}",
+                        )
+                    )
+
+                for rel, source in [(rel_device_vlan, device), (rel_rack_vlan, rack)]:
+                    if (rel.id, source.id, vlan.id) in associations:
+                        continue
+                    new_associations.append(
+                        RelationshipAssociation(
+                            relationship=rel,
+                            source_type=rel.source_type,
+                            source_id=source.id,
+                            destination_type=rel.destination_type,
+                            destination_id=vlan.id,
+                        )
+                    )
+
+        self.verify_allocations()
+        VLAN.objects.bulk_create(new_vlans)
+        Prefix.objects.bulk_create(new_prefixes)
+        IPAddress.objects.bulk_create(new_ips)
+        Device.objects.bulk_update(devices_to_update, ["primary_ip4"])
+        RelationshipAssociation.objects.bulk_create(new_associations)
+
+    # ----------------------------------------------------------------------------
+    # Cabling
+    # ----------------------------------------------------------------------------
+    def build_cabling(self):
+        """Connect the edges together and every leaf to both edges with P2P links."""
+        edge_01 = f"{self.site_code}-edge-01"
+        edge_02 = f"{self.site_code}-edge-02"
+
+        # Connect Edge Routers Together
+        links = list(zip(self.interfaces_with_role(edge_01, "peer"), self.interfaces_with_role(edge_02, "peer")))[:2]
+
+        # Connect Edge and Leaf Switches together
+        leaf_intfs_01 = iter(self.interfaces_with_role(edge_01, "leaf"))
+        leaf_intfs_02 = iter(self.interfaces_with_role(edge_02, "leaf"))
+        for i in range(1, self.roles["leaf"]["nbr"] + 1):
+            edge_intfs = iter(self.interfaces_with_role(f"{self.site_code}-leaf-{i:02}", "edge"))
+            links.append((next(leaf_intfs_01), next(edge_intfs)))
+            links.append((next(leaf_intfs_02), next(edge_intfs)))
+
+        new_prefixes, new_ips = [], []
+        for intf1, intf2 in links:
+            self.create_p2p_link(intf1, intf2, new_prefixes, new_ips)
+
+        self.verify_allocations()
+        Prefix.objects.bulk_create(new_prefixes)
+        IPAddress.objects.bulk_create(new_ips)
+
+    def create_p2p_link(self, intf1, intf2, new_prefixes, new_ips):
+        """Create a Point to Point link between 2 interfaces.
+        This function will:
+        - Connect the 2 interfaces with a cable
+        - Plan a new Prefix from the "point-to-point" container associated with this site
+        - Plan one IP address on each interface from the previous prefix
+        Prefixes and IP addresses are appended to `new_prefixes` and `new_ips` for a bulk insert.
+        """
+        if intf1.cable_id or intf2.cable_id:
+            # Links built by a previous run are left untouched
+            if intf1.cable_id != intf2.cable_id:
+                self.job.log_warning(
+                    message=f"Unable to create a P2P link between {intf1.device.name}::{intf1} and {intf2.device.name}::{intf2}"
+                )
+            return False
+
+        # Cables are saved one by one so Nautobot updates the terminations and cable paths
+        cable = Cable(termination_a=intf1, termination_b=intf2, status=self.cache.status(Cable, "connected"))
+        cable.save()
+
+        # Find Next available Network
+        subnet = self.next_subnet("point-to-point", P2P_PREFIX_SIZE)
+        new_prefixes.append(
+            Prefix(
+                prefix=str(subnet),
+                status=self.cache.status(Prefix, "p2p"),
+                role=self.cache.get(Role, "point-to-point"),
+                site=self.site,
+                tenant=self.tenant,
+            )
+        )
+
+        # Create IP Addresses on both sides
+        for address, intf in zip(subnet, [intf1, intf2]):
+            new_ips.append(
+                IPAddress(
+                    address=str(address),
+                    assigned_object=intf,
+                    status=self.cache.status(IPAddress, "active"),
+                    tenant=self.tenant,
+                    dns_name=f"ip-{str(address).replace('.', '-')}.p2p.{self.site.slug}.{self.tenant.description}",
+                )
+            )
+        return True
+
+    # ----------------------------------------------------------------------------
+    # Create Circuits and Connect them
+    # ----------------------------------------------------------------------------
+    def build_transit(self):
+        """Create one transit circuit per provider on each edge router."""
+        # Dark fiber carries on with the external interfaces left after transit
+        self.external_intfs = [
+            iter(self.interfaces_with_role(f"{self.site_code}-edge-01", "external")),
+            iter(self.interfaces_with_role(f"{self.site_code}-edge-02", "external")),
+        ]
+
+        for provider in self.available_providers("Transit"):
+            for intfs_list in self.external_intfs:
+                intf = next(intfs_list)
+                if intf.cable_id:
+                    continue
+                circuit = self.get_or_create_circuit(provider, self.cache.get(CircuitType, "Transit"), intf)
+                ct = self.terminate_circuit(circuit, "A", self.site)
+                Cable.objects.create(termination_a=intf, termination_b=ct, status=self.cache.status(Cable, "connected"))
+
+    # ----------------------------------------------------------------------------
+    # Link multiple sites at a single location
+    # ----------------------------------------------------------------------------
+    def build_dark_fiber(self, batch):
+        """Connect this POP with dark fiber to every lower numbered POP of the same location.
+
+        `batch` maps site codes to the planners built in the same run, their sites and free
+        external interfaces are taken from memory. Other sites are loaded in a single query.
+        """
+        if self.site_code.endswith("1"):
+            return
+
+        site_abreviation = self.site_code[0:3]
+        other_codes = [f"{site_abreviation}{num:02}" for num in range(1, int(self.site_code[3:5]))]
+        other_sites = {code: batch[code].site for code in other_codes if code in batch}
+        other_intfs = defaultdict(list)
+        for code in other_sites:
+            for num in (1, 2):
+                device_name = f"{code}-edge-{num:02}"
+                other_intfs[device_name] = [
+                    intf for intf in batch[code].interfaces_with_role(device_name, "external") if not intf.cable_id
+                ]
+
+        missing_codes = [code for code in other_codes if code not in batch]
+        if missing_codes:
+            other_sites.update(
+                (site.slug, site) for site in Site.objects.filter(tenant=self.tenant, slug__in=missing_codes)
+            )
+            for intf in Interface.objects.filter(
+                device__site__slug__in=missing_codes,
+                device__tenant=self.tenant,
+                device__name__in=[f"{code}-edge-{num:02}" for code in missing_codes for num in (1, 2)],
+                _custom_field_data__role="external",
+                cable__isnull=True,
+            ).select_related("device"):
+                other_intfs[intf.device.name].append(intf)
+
+        for other_code in other_codes:
+            other_site = other_sites[other_code]
+            other_external_intfs = [
+                iter(other_intfs[f"{other_code}-edge-01"]),
+                iter(other_intfs[f"{other_code}-edge-02"]),
+            ]
+            for provider in self.available_providers("Dark Fiber"):
+                for intfs_list, other_intfs_list in zip(self.external_intfs, other_external_intfs):
+                    intf = next(intfs_list)
+                    if intf.cable_id:
+                        continue
+                    other_intf = next(other_intfs_list)
+
+                    circuit = self.get_or_create_circuit(provider, self.cache.get(CircuitType, "Dark Fiber"), intf)
+                    ct = self.terminate_circuit(circuit, "A", self.site)
+                    ctz = self.terminate_circuit(circuit, "Z", other_site)
+
+                    status = self.cache.status(Cable, "connected")
+                    Cable.objects.create(termination_a=intf, termination_b=ct, status=status)
+                    Cable.objects.create(termination_a=other_intf, termination_b=ctz, status=status)
+
+    def available_providers(self, circuit_type):
+        """Return the transit providers that exist, logging a warning for the missing ones."""
+        if not self.cache.get(CircuitType, circuit_type):
+            self.job.log_warning(message=f"Unable to find CircuitType '{circuit_type}', skipping")
+            return []
+
+        available = []
+        for name in TRANSIT_PROVIDERS:
+            provider = self.cache.get(Provider, name)
+            if not provider:
+                self.job.log_warning(message=f"Unable to find Circuit Provider {name}, skipping")
+                continue
+            available.append(provider)
+        return available
+
+    def get_or_create_circuit(self, provider, circuit_type, intf):
+        """Find or create the circuit landing on a local interface."""
+        circuit_id = circuit_id_for(provider, self.site_code, intf)
+        circuit, _ = Circuit.objects.get_or_create(
+            cid=circuit_id,
+            type=circuit_type,
+            provider=provider,
+            status=self.cache.status(Circuit, "active"),
+            tenant=self.tenant,
+        )
+        self.job.log_success(circuit, f"Circuit {circuit_id} successfully created")
+        return circuit
+
+    @staticmethod
+    def terminate_circuit(circuit, term_side, site):
+        """Replace the termination of a circuit on one side with a new one at a site."""
+        termination = circuit.termination_a if term_side == "A" else circuit.termination_z
+        if termination:
+            termination.delete()
+
+        ct = CircuitTermination(
+            circuit=circuit,
+            site=site,
+            term_side=term_side,
+        )
+        ct.validated_save()
+        return ct
@@ -0,0 +1,104 @@
+"""In-memory allocation of fixed size subnets and host addresses from a Nautobot container Prefix."""
+from ipaddress import IPv4Network
+
+from nautobot.ipam.models import Prefix
+
+
+class AllocationConflict(Exception):
+    """Raised when another job used a subnet this allocator handed out."""
+
+
+class SubnetAllocator:
+    """Hand out subnets of one size from a container, tracking free space in a bitmap.
+
+    The container row is locked and its children are loaded once. Each block of
+    `prefix_length` in the container is then one bit in the bitmap, and a cursor
+    moves forward over the used blocks, so allocating is O(1) amortized and never
+    queries the database. With `hosts=True` the children are the IP addresses of
+    the container and its network and broadcast addresses are never handed out.
+    """
+
+    def __init__(self, container, prefix_length, hosts=False):
+        """Initializer."""
+        self.container = container
+        self.network = IPv4Network(str(container.prefix))
+        self.prefix_length = prefix_length
+        self.hosts = hosts
+        self.block_size = 2 ** (32 - prefix_length)
+        self.size = 2 ** (prefix_length - self.network.prefixlen)
+        self.bitmap = bytearray((self.size + 7) // 8)
+        self.cursor = 0
+        self.allocated = []
+        self._existing = set()
+        self.load()
+
+    def load(self):
+        """Lock the container and mark every block used by its existing children."""
+        # Concurrent jobs allocating from the same container wait here until this one commits
+        list(Prefix.objects.select_for_update().filter(pk=self.container.pk))
+
+        self._existing = set(self._children())
+        for network in self._existing:
+            for index in self._indexes(network):
+                self._mark(index)
+
+        if self.hosts and self.network.prefixlen < 31:
+            self._mark(0)
+            self._mark(self.size - 1)
+
+    def _children(self):
+        """Return the networks of the Prefixes or IP addresses currently inside the container."""
+        if self.hosts:
+            return [IPv4Network(f"{ip.address.ip}/32") for ip in self.container.get_child_ips()]
+        return [IPv4Network(str(prefix.prefix)) for prefix in self.container.get_child_prefixes()]
+
+    def _indexes(self, network):
+        """Return the range of bitmap blocks a network overlaps, clamped to the container."""
+        base = int(self.network.network_address)
+        first = max((int(network.network_address) - base) // self.block_size, 0)
+        last = min((int(network.broadcast_address) - base) // self.block_size, self.size - 1)
+        return range(first, last + 1)
+
+    def _mark(self, index):
+        self.bitmap[index >> 3] |= 1 << (index & 7)
+
+    def _is_used(self, index):
+        return self.bitmap[index >> 3] & (1 << (index & 7))
+
+    def allocate(self):
+        """Return the next free subnet of the container as an IPv4Network."""
+        while self.cursor < self.size:
+            # Skip whole bytes of used blocks at once
+            if not self.cursor & 7 and self.bitmap[self.cursor >> 3] == 0xFF:
+                self.cursor += 8
+                continue
+            if not self._is_used(self.cursor):
+                break
+            self.cursor += 1
+        else:
+            raise ValueError(f"No /{self.prefix_length} left in {self.network}")
+
+        self._mark(self.cursor)
+        subnet = IPv4Network(
+            (int(self.network.network_address) + self.cursor * self.block_size, self.prefix_length)
+        )
+        self.allocated.append(subnet)
+        return subnet
+
+    def verify(self):
+        """Make sure nothing created since load() overlaps the allocated subnets.
+
+        Call this right before the allocated objects are written in bulk.
+        """
+        if not self.allocated:
+            return
+
+        allocated = {index for subnet in self.allocated for index in self._indexes(subnet)}
+        for network in set(self._children()) - self._existing:
+            if allocated.intersection(self._indexes(network)):
+                raise AllocationConflict(
+                    f"{network} was created in {self.network} by another job, run this job again"
+                )
+
+        # What was handed out so far is about to be written, it is no longer a conflict
+        self._existing.update(self.allocated)
@@ -0,0 +1,87 @@
+"""Per-job cache of the reference data (Statuses, Roles, Platforms, ...) jobs look up over and over."""
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_delete, post_save
+
+from nautobot.circuits.models import CircuitType, Provider
+from nautobot.dcim.models import DeviceRole, DeviceType, Platform
+from nautobot.extras.models import Relationship, Status
+from nautobot.ipam.models import Role
+
+# Reference models cached by the natural key jobs look them up with
+REFERENCE_MODELS = {
+    Role: "slug",
+    DeviceRole: "slug",
+    Platform: "slug",
+    DeviceType: "slug",
+    Relationship: "name",
+    Provider: "name",
+    CircuitType: "name",
+}
+
+
+class ReferenceCache:
+    """Load reference objects once per job and serve every later lookup from memory.
+
+    `warm()` loads all Statuses and every model in REFERENCE_MODELS with one query each.
+    Lookups for objects that were not warmed fall back to the database once and are
+    remembered. Saving or deleting a reference object anywhere in the process drops the
+    cached objects of that model, and `log_stats()` reports hits and misses in the job log.
+    """
+
+    def __init__(self):
+        """Initializer."""
+        self.hits = 0
+        self.misses = 0
+        self._statuses = {}
+        self._objects = {model: {} for model in REFERENCE_MODELS}
+
+        # Bound methods are weak references, receivers go away with the cache
+        for model in [Status, *REFERENCE_MODELS]:
+            post_save.connect(self.invalidate, sender=model)
+            post_delete.connect(self.invalidate, sender=model)
+
+    def warm(self):
+        """Load every Status and reference object in a single pass."""
+        self._statuses = {}
+        for status in Status.objects.prefetch_related("content_types"):
+            for content_type in status.content_types.all():
+                self._statuses[(content_type.id, status.slug)] = status
+
+        for model, field in REFERENCE_MODELS.items():
+            self._objects[model] = {getattr(obj, field): obj for obj in model.objects.all()}
+        return self
+
+    def invalidate(self, sender, **kwargs):
+        """Drop the cached objects of a model, used as a post_save/post_delete receiver."""
+        if sender is Status:
+            self._statuses = {}
+        else:
+            self._objects[sender] = {}
+
+    def status(self, model, slug):
+        """Return the Status with this slug for a model, raise Status.DoesNotExist if there is none."""
+        key = (ContentType.objects.get_for_model(model).id, slug)
+        if key in self._statuses:
+            self.hits += 1
+            return self._statuses[key]
+
+        self.misses += 1
+        self._statuses[key] = Status.objects.get_for_model(model).get(slug=slug)
+        return self._statuses[key]
+
+    def get(self, model, key):
+        """Return the reference object of a model by its natural key, or None if it does not exist."""
+        objects = self._objects[model]
+        if key in objects:
+            self.hits += 1
+            return objects[key]
+
+        self.misses += 1
+        objects[key] = model.objects.filter(**{REFERENCE_MODELS[model]: key}).first()
+        return objects[key]
+
+    def log_stats(self, job):
+        """Report the cache hit and miss counters in the job log."""
+        total = self.hits + self.misses
+        ratio = self.hits / total if total else 0
+        job.log_info(message=f"Reference cache: {self.hits} hits, {self.misses} misses ({ratio:.0%} hit rate)")
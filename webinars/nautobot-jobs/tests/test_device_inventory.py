@@ -0,0 +1,71 @@
+"""Tests of the device inventory loader, run them in Nautobot with `nautobot-server test tests`."""
+import os
+import sys
+
+from django.test import TestCase, override_settings
+from nautobot.dcim.models import Device, DeviceRole, DeviceType, Manufacturer, Platform, Site
+from nautobot.extras.models import Status
+from nautobot.ipam.models import IPAddress
+
+# The helper modules are next to the jobs, like when Nautobot loads them
+JOBS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "jobs")
+if JOBS_DIR not in sys.path:
+    sys.path.append(JOBS_DIR)
+
+from device_inventory import load_inventory
+
+
+class LoadInventoryTestCase(TestCase):
+    """load_inventory() runs the same number of queries whatever the number of devices."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.status = Status.objects.get(slug="active")
+        cls.site = Site.objects.create(name="NYC", slug="nyc", status=cls.status)
+        manufacturer = Manufacturer.objects.create(name="Cisco", slug="cisco")
+        cls.device_type = DeviceType.objects.create(manufacturer=manufacturer, model="CSR1000v", slug="csr1000v")
+        cls.device_role = DeviceRole.objects.create(name="edge", slug="edge")
+        cls.platform = Platform.objects.create(name="Cisco IOS", slug="cisco_ios")
+
+    def create_devices(self, count):
+        """Create devices with a platform and a primary IPv4 address, and one without either."""
+        for i in range(count):
+            device = Device.objects.create(
+                name=f"nyc-edge-{i:02}",
+                device_type=self.device_type,
+                device_role=self.device_role,
+                site=self.site,
+                status=self.status,
+                platform=self.platform,
+            )
+            device.primary_ip4 = IPAddress.objects.create(address=f"10.0.0.{i + 1}/32", status=self.status)
+            device.save()
+        Device.objects.create(
+            name=f"nyc-edge-{count:02}",
+            device_type=self.device_type,
+            device_role=self.device_role,
+            site=self.site,
+            status=self.status,
+        )
+
+    def assert_inventory(self, count):
+        """Load the inventory of count devices in a single query, chunks included."""
+        self.create_devices(count)
+        with self.assertNumQueries(1):
+            inventory = [
+                (device.name, host, platform)
+                for device, host, platform in load_inventory(Device.objects.all(), chunk_size=5)
+            ]
+
+        self.assertEqual(len(inventory), count + 1)
+        self.assertEqual(inventory[0], ("nyc-edge-00", "10.0.0.1", "cisco_ios"))
+        self.assertEqual(inventory[-1], (f"nyc-edge-{count:02}", None, None))
+
+    # Set in the settings, PREFER_IPV4 is not read from the config table
+    @override_settings(PREFER_IPV4=False)
+    def test_one_device(self):
+        self.assert_inventory(1)
+
+    @override_settings(PREFER_IPV4=False)
+    def test_many_devices(self):
+        self.assert_inventory(20)